@@ -0,0 +1,153 @@
+from typing import Any, Dict, Optional, Tuple
+from abc import ABC, abstractmethod
+from pathlib import Path
+import sqlite3
+import json
+import time
+
+DEFAULT_CACHE_PATH = Path.home() / '.cache' / 'AniDL' / 'cache.sqlite3'
+
+class BaseCache(ABC):
+    """元数据缓存接口，按 (命名空间, 键) 存取可 JSON 序列化的值"""
+
+    @abstractmethod
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        """获取缓存值，不存在或已过期时返回 None"""
+        pass
+
+    @abstractmethod
+    def set(self, namespace: str, key: str, value: Any, ttl: float) -> None:
+        """写入缓存值，ttl 单位：秒"""
+        pass
+
+    @abstractmethod
+    def delete(self, namespace: str, key: str) -> None:
+        """删除缓存值"""
+        pass
+
+    @abstractmethod
+    def clear(self, namespace: Optional[str] = None) -> None:
+        """清空命名空间中的缓存，未指定命名空间时清空全部"""
+        pass
+
+    def close(self) -> None:
+        """释放缓存占用的资源"""
+        pass
+
+class NullCache(BaseCache):
+    """不缓存任何内容，用于禁用缓存"""
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        return None
+
+    def set(self, namespace: str, key: str, value: Any, ttl: float) -> None:
+        pass
+
+    def delete(self, namespace: str, key: str) -> None:
+        pass
+
+    def clear(self, namespace: Optional[str] = None) -> None:
+        pass
+
+class SQLiteCache(BaseCache):
+    """基于 SQLite 的持久化缓存，条目按 TTL 过期，总大小超出 max_size 时按最近最少使用淘汰"""
+
+    def __init__(self, path: str | Path = DEFAULT_CACHE_PATH, max_size: int = 64 * 1024 * 1024):
+        if str(path) != ':memory:':
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size # 缓存总大小上限，单位：字节
+        self.conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS cache ('
+            'namespace TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL, size INTEGER NOT NULL, '
+            'expires_at REAL NOT NULL, accessed_at REAL NOT NULL, PRIMARY KEY (namespace, key))'
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS cache_accessed_at ON cache (accessed_at)')
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        now = time.time()
+        row = self.conn.execute(
+            'SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ?', (namespace, key)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at <= now:
+            self.delete(namespace, key)
+            return None
+        self.conn.execute('UPDATE cache SET accessed_at = ? WHERE namespace = ? AND key = ?', (now, namespace, key))
+        return json.loads(value)
+
+    def set(self, namespace: str, key: str, value: Any, ttl: float) -> None:
+        now = time.time()
+        blob = json.dumps(value, ensure_ascii=False).encode()
+        self.conn.execute(
+            'INSERT OR REPLACE INTO cache (namespace, key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)',
+            (namespace, key, blob, len(blob), now + ttl, now)
+        )
+        self._evict(now)
+
+    def delete(self, namespace: str, key: str) -> None:
+        self.conn.execute('DELETE FROM cache WHERE namespace = ? AND key = ?', (namespace, key))
+
+    def clear(self, namespace: Optional[str] = None) -> None:
+        if namespace is None:
+            self.conn.execute('DELETE FROM cache')
+        else:
+            self.conn.execute('DELETE FROM cache WHERE namespace = ?', (namespace,))
+
+    def size(self) -> int:
+        """返回缓存的总大小，单位：字节"""
+        return self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM cache').fetchone()[0]
+
+    def _evict(self, now: float) -> None:
+        """先删除过期条目，仍超出上限时按访问时间从旧到新删除"""
+        self.conn.execute('DELETE FROM cache WHERE expires_at <= ?', (now,))
+        overflow = self.size() - self.max_size
+        if overflow <= 0:
+            return
+        freed = 0
+        victims = []
+        for namespace, key, size in self.conn.execute('SELECT namespace, key, size FROM cache ORDER BY accessed_at'):
+            if freed >= overflow:
+                break
+            victims.append((namespace, key))
+            freed += size
+        self.conn.executemany('DELETE FROM cache WHERE namespace = ? AND key = ?', victims)
+
+    def close(self) -> None:
+        self.conn.close()
+
+class MemoryCache(BaseCache):
+    """进程内缓存，条目按 TTL 过期；用于不应写入磁盘、也不应被其他进程读到的数据"""
+
+    def __init__(self):
+        self._entries: Dict[Tuple[str, str], Tuple[Any, float]] = {} # (命名空间, 键) -> (值, 过期时间)
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        entry = self._entries.get((namespace, key))
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.time():
+            del self._entries[(namespace, key)]
+            return None
+        return value
+
+    def set(self, namespace: str, key: str, value: Any, ttl: float) -> None:
+        now = time.time()
+        # 写入时顺便清理过期条目，避免长时间运行时不断增长
+        for entry_key in [entry_key for entry_key, (_, expires_at) in self._entries.items() if expires_at <= now]:
+            del self._entries[entry_key]
+        self._entries[(namespace, key)] = (value, now + ttl)
+
+    def delete(self, namespace: str, key: str) -> None:
+        self._entries.pop((namespace, key), None)
+
+    def clear(self, namespace: Optional[str] = None) -> None:
+        if namespace is None:
+            self._entries.clear()
+        else:
+            for entry_key in [entry_key for entry_key in self._entries if entry_key[0] == namespace]:
+                del self._entries[entry_key]
@@ -0,0 +1,277 @@
+from AniDL.Models import VideoMedia, AudioMedia, UrlType, FileType
+from AniDL.Playlist import Segment
+from typing import List, Dict, Optional, Tuple, Iterator
+from urllib.parse import urljoin, urlsplit
+from pydantic import BaseModel
+import xml.etree.ElementTree as ET
+import math
+import re
+
+# SegmentTemplate 中的标识符，如 $Number%05d$、$RepresentationID$，$$ 表示 $ 本身
+_IDENTIFIER = re.compile(r'\$(RepresentationID|Number|Time|Bandwidth|)(?:%0(\d+)d)?\$')
+_DURATION = re.compile(r'^P(?:(\d+(?:\.\d+)?)Y)?(?:(\d+(?:\.\d+)?)M)?(?:(\d+(?:\.\d+)?)D)?(?:T(?:(\d+(?:\.\d+)?)H)?(?:(\d+(?:\.\d+)?)M)?(?:(\d+(?:\.\d+)?)S)?)?$')
+
+class DashError(Exception):
+    """当 MPD 无法解析或缺少下载所需的信息时引发的异常"""
+    def __init__(self, message: str):
+        super().__init__(f"MPD 解析失败：{message}")
+
+class RepresentationNotFoundError(DashError):
+    """当 MPD 中不存在指定的 Representation 时引发的异常"""
+    def __init__(self, representation_id: Optional[str]):
+        super().__init__(f"找不到 Representation '{representation_id}'")
+
+class DashRepresentation(BaseModel):
+    """MPD 中的一个 Representation，已合并 AdaptationSet 上继承的属性，分片在下载时才展开"""
+    id: str
+    content_type: str # video, audio, text
+    mime_type: Optional[str] = None
+    codecs: Optional[str] = None
+    bandwidth: Optional[int] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    lang: Optional[str] = None
+    base_url: str
+    protected: bool = False # 带有 ContentProtection（CENC 等），无法直接解密
+    period_duration: Optional[float] = None # 单位：秒
+    template: Optional[Dict[str, str]] = None # SegmentTemplate 的属性
+    timeline: Optional[List[Tuple[Optional[int], int, int]]] = None # SegmentTimeline 的 (t, d, r)
+    segment_list: Optional[List[Tuple[str, Optional[Tuple[int, int]]]]] = None # SegmentList 的 (地址, 字节范围)
+    initialization: Optional[Tuple[str, Optional[Tuple[int, int]]]] = None # SegmentList/SegmentBase 的初始化分片
+
+class DashManifest(BaseModel):
+    """MPD 文件中第一个 Period 的所有 Representation"""
+    url: str
+    duration: Optional[float] = None # 媒体总时长，单位：秒
+    representations: List[DashRepresentation]
+
+    def representation(self, representation_id: Optional[str] = None) -> DashRepresentation:
+        """按 ID 查找 Representation，未指定时返回带宽最高的视频"""
+        if representation_id is None:
+            videos = [representation for representation in self.representations if representation.content_type == 'video']
+            if videos:
+                return max(videos, key=lambda representation: representation.bandwidth or 0)
+        for representation in self.representations:
+            if representation.id == representation_id:
+                return representation
+        raise RepresentationNotFoundError(representation_id)
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """解析 ISO 8601 时长，如 PT1H2M3.5S，返回秒数"""
+    if not value:
+        return None
+    match = _DURATION.match(value.strip())
+    if match is None:
+        raise DashError(f"无效的时长 {value}")
+    years, months, days, hours, minutes, seconds = (float(group) if group else 0.0 for group in match.groups())
+    return ((years * 365 + months * 30 + days) * 24 + hours) * 3600 + minutes * 60 + seconds
+
+def _name(element: ET.Element) -> str:
+    """去掉命名空间的标签名"""
+    return element.tag.rsplit('}', 1)[-1]
+
+def _children(element: Optional[ET.Element], name: str) -> List[ET.Element]:
+    if element is None:
+        return []
+    return [child for child in element if _name(child) == name]
+
+def _child(element: Optional[ET.Element], name: str) -> Optional[ET.Element]:
+    children = _children(element, name)
+    return children[0] if children else None
+
+def _inherited(element: ET.Element, parent: ET.Element, name: str) -> Optional[ET.Element]:
+    """取 element 的子元素，没有时取 parent 上的同名子元素"""
+    child = _child(element, name)
+    return child if child is not None else _child(parent, name)
+
+def _base_url(base: str, element: ET.Element) -> str:
+    child = _child(element, 'BaseURL')
+    return urljoin(base, child.text.strip()) if child is not None and child.text else base
+
+def _byte_range(value: Optional[str]) -> Optional[Tuple[int, int]]:
+    """把 first-last 形式的范围转换为 (长度, 偏移)，与 HLS 分片一致"""
+    if not value:
+        return None
+    first, _, last = value.partition('-')
+    return int(last) - int(first) + 1, int(first)
+
+def _content_type(adaptation: ET.Element, representation: ET.Element) -> str:
+    content_type = adaptation.get('contentType')
+    if content_type:
+        return content_type
+    mime_type = representation.get('mimeType') or adaptation.get('mimeType') or ''
+    return mime_type.split('/', 1)[0] or 'video'
+
+def parse_mpd(text: str, url: str) -> DashManifest:
+    """解析 MPD 文本；只取第一个 Period，分片地址不在此处展开"""
+    try:
+        root = ET.fromstring(text)
+    except ET.ParseError as e:
+        raise DashError(str(e))
+    period = _child(root, 'Period')
+    if period is None:
+        raise DashError("没有 Period")
+    duration = parse_duration(root.get('mediaPresentationDuration'))
+    period_duration = parse_duration(period.get('duration')) or duration
+    period_base = _base_url(_base_url(url, root), period)
+    representations = []
+    for adaptation in _children(period, 'AdaptationSet'):
+        adaptation_base = _base_url(period_base, adaptation)
+        protected = bool(_children(adaptation, 'ContentProtection'))
+        for element in _children(adaptation, 'Representation'):
+            # Representation 上的设置覆盖 AdaptationSet 上的
+            template_elements = [child for child in (_child(parent, 'SegmentTemplate') for parent in (period, adaptation, element)) if child is not None]
+            template = None
+            timeline = None
+            if template_elements:
+                template = {}
+                for template_element in template_elements:
+                    template.update(template_element.attrib)
+                    timeline_element = _child(template_element, 'SegmentTimeline')
+                    if timeline_element is not None:
+                        timeline = [
+                            (int(s.get('t')) if s.get('t') is not None else None, int(s.get('d')), int(s.get('r', 0)))
+                            for s in _children(timeline_element, 'S')
+                        ]
+            base_url = _base_url(adaptation_base, element)
+            segment_list = None
+            initialization = None
+            list_element = _inherited(element, adaptation, 'SegmentList')
+            if list_element is not None:
+                segment_list = [
+                    (urljoin(base_url, segment_url.get('media', '')), _byte_range(segment_url.get('mediaRange')))
+                    for segment_url in _children(list_element, 'SegmentURL')
+                ]
+            init_parent = list_element if list_element is not None else _inherited(element, adaptation, 'SegmentBase')
+            init_element = _child(init_parent, 'Initialization')
+            if init_element is not None:
+                initialization = (urljoin(base_url, init_element.get('sourceURL', '')), _byte_range(init_element.get('range')))
+            representations.append(DashRepresentation(
+                id=element.get('id', ''),
+                content_type=_content_type(adaptation, element),
+                mime_type=element.get('mimeType') or adaptation.get('mimeType'),
+                codecs=element.get('codecs') or adaptation.get('codecs'),
+                bandwidth=int(element.get('bandwidth')) if element.get('bandwidth') else None,
+                width=int(element.get('width') or adaptation.get('width') or 0) or None,
+                height=int(element.get('height') or adaptation.get('height') or 0) or None,
+                lang=element.get('lang') or adaptation.get('lang'),
+                base_url=base_url,
+                protected=protected or bool(_children(element, 'ContentProtection')),
+                period_duration=period_duration,
+                template=template,
+                timeline=timeline,
+                segment_list=segment_list,
+                initialization=initialization,
+            ))
+    return DashManifest(url=url, duration=duration, representations=representations)
+
+def _expand(template: str, representation: DashRepresentation, number: Optional[int] = None, time: Optional[int] = None) -> str:
+    values = {'RepresentationID': representation.id, 'Number': number, 'Time': time, 'Bandwidth': representation.bandwidth}
+
+    def replace(match: re.Match) -> str:
+        name, width = match.groups()
+        if not name:
+            return '$'
+        value = values[name]
+        if value is None:
+            raise DashError(f"模板 {template} 中的 ${name}$ 没有可用的值")
+        return str(value).zfill(int(width)) if width else str(value)
+
+    return _IDENTIFIER.sub(replace, template)
+
+def iter_segments(representation: DashRepresentation) -> Iterator[Segment]:
+    """逐个产出 Representation 的分片：有初始化分片时它是序号 0，媒体分片紧随其后；sequence 为 $Number$
+
+    SegmentTimeline 和按 duration 计数的 SegmentTemplate 在迭代时才计算地址，长片源不会一次生成全部分片。
+    """
+    index = 0
+    template = representation.template
+    if template is not None:
+        if 'initialization' in template:
+            yield Segment(index=index, url=urljoin(representation.base_url, _expand(template['initialization'], representation)))
+            index += 1
+        media = template.get('media')
+        if media is None:
+            raise DashError(f"Representation '{representation.id}' 的 SegmentTemplate 没有 media 属性")
+        timescale = int(template.get('timescale', 1))
+        number = int(template.get('startNumber', 1))
+        if representation.timeline is not None:
+            end = None
+            if representation.period_duration is not None:
+                end = int(template.get('presentationTimeOffset', 0)) + representation.period_duration * timescale
+            time = 0
+            timeline = representation.timeline
+            for position, (start, duration, repeat) in enumerate(timeline):
+                if start is not None:
+                    time = start
+                if repeat < 0:
+                    # r 为负数时一直重复到下一个 S 的开始时间或 Period 结束
+                    next_start = timeline[position + 1][0] if position + 1 < len(timeline) else None
+                    until = next_start if next_start is not None else end
+                    if until is None:
+                        raise DashError(f"Representation '{representation.id}' 的 SegmentTimeline 无法确定结束时间")
+                    repeat = math.ceil((until - time) / duration) - 1
+                for _ in range(repeat + 1):
+                    url = urljoin(representation.base_url, _expand(media, representation, number, time))
+                    yield Segment(index=index, url=url, sequence=number, duration=duration / timescale)
+                    index += 1
+                    number += 1
+                    time += duration
+            return
+        if 'duration' not in template or representation.period_duration is None:
+            raise DashError(f"Representation '{representation.id}' 无法确定分片数")
+        duration = int(template['duration'])
+        count = math.ceil(representation.period_duration * timescale / duration)
+        for _ in range(count):
+            url = urljoin(representation.base_url, _expand(media, representation, number, (number - int(template.get('startNumber', 1))) * duration))
+            yield Segment(index=index, url=url, sequence=number, duration=duration / timescale)
+            index += 1
+            number += 1
+        return
+    if representation.initialization is not None and representation.segment_list is not None:
+        url, byte_range = representation.initialization
+        yield Segment(index=index, url=url, byte_range=byte_range)
+        index += 1
+    if representation.segment_list is not None:
+        for url, byte_range in representation.segment_list:
+            yield Segment(index=index, url=url, sequence=index, byte_range=byte_range)
+            index += 1
+        return
+    # SegmentBase 或只有 BaseURL：整个文件就是一个分片，其中已包含初始化数据
+    yield Segment(index=index, url=representation.base_url)
+
+def dash_medias(manifest: DashManifest, episode_id: int, headers: Optional[Dict[str, str]] = None, namespace: str = "global") -> Tuple[List[VideoMedia], List[AudioMedia]]:
+    """把 MPD 中的视频、音频 Representation 转换为 VideoMedia、AudioMedia 并登记
+
+    同一画质和编码（或语言和编码）有多个 Representation 时只保留带宽最高的，避免索引重复。
+    """
+    url_type = UrlType.HTTP if urlsplit(manifest.url).scheme == 'http' else UrlType.HTTPS
+    length = int(manifest.duration * 1000) if manifest.duration else None
+    videos: Dict[Tuple[int, int, Optional[str]], dict] = {}
+    audios: Dict[Tuple[Optional[str], Optional[str]], dict] = {}
+    for representation in sorted(manifest.representations, key=lambda representation: representation.bandwidth or 0, reverse=True):
+        record = {
+            'episode_id': episode_id,
+            'url': manifest.url,
+            'url_type': url_type,
+            'file_type': FileType.MPD,
+            'headers': headers,
+            'length': length,
+            'biterate': representation.bandwidth,
+            'size': int(representation.bandwidth * manifest.duration / 8) if representation.bandwidth and manifest.duration else None,
+            'codec': representation.codecs,
+            'representation_id': representation.id,
+        }
+        if representation.content_type == 'video' and representation.width and representation.height:
+            videos.setdefault((representation.width, representation.height, representation.codecs), dict(record, width=representation.width, height=representation.height))
+        elif representation.content_type == 'audio':
+            audios.setdefault((representation.lang, representation.codecs), dict(record, language=representation.lang))
+    # 不同分辨率可能映射到同一画质名，按画质再去重一次
+    video_records = {}
+    for record in videos.values():
+        quality = VideoMedia._prepare_data(dict(record))['quality']
+        video_records.setdefault((quality, record['codec']), record)
+    return (
+        VideoMedia.construct_many(list(video_records.values()), namespace=namespace),
+        AudioMedia.construct_many(list(audios.values()), namespace=namespace),
+    )
@@ -1,8 +1,13 @@
 from AniDL.Models import Season, Episode, VideoMedia, AudioMedia, SubtitleMedia
-from typing import List, Dict, Any, Optional, Tuple
+from AniDL.Cache import BaseCache
+from AniDL.Metrics import Metrics, metrics
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator
 from abc import ABC, abstractmethod
 from datetime import datetime
-from httpx import Cookies
+from httpx import Cookies, AsyncBaseTransport
+import functools
+import inspect
+import asyncio
 
 class SeasonNotExistsError(Exception):
     """当季不存在时引发的异常"""
@@ -10,6 +15,32 @@ class SeasonNotExistsError(Exception):
         message = f"季不存在：{url}"
         super().__init__(message)
 
+class RetryExhaustedError(Exception):
+    """当请求重试次数用尽时引发的异常"""
+    def __init__(self, url: str, retries: int, reason: str):
+        self.url = url
+        self.reason = reason
+        message = f"请求失败（已重试 {retries} 次）：{url}，原因：{reason}"
+        super().__init__(message)
+
+class StreamNotAvailableError(Exception):
+    """当多次尝试后仍无法获取剧集播放地址时引发的异常"""
+    def __init__(self, episode_id: int, retries: int, detail: Any):
+        self.detail = detail
+        message = f"无法获取剧集 {episode_id} 的播放地址（已重试 {retries} 次）：{detail}"
+        super().__init__(message)
+
+# 自动统计耗时的适配器方法
+INSTRUMENTED_METHODS = ('login', 'username', 'subscription_due_date', 'parse_playurl', 'parse_stream')
+
+def _timed(name: str, method):
+    """包装适配器方法，把耗时记录到 adapter_method_seconds 直方图"""
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        with self.metrics.timer('adapter_method_seconds', adapter=self.Config.adapter_name, method=name):
+            return await method(self, *args, **kwargs)
+    return wrapper
+
 class BaseAdapterInterface(ABC):
     """基础适配器接口"""
     # 定义一些常量
@@ -19,11 +50,38 @@ class BaseAdapterInterface(ABC):
         base_play_url: List[str]
         custom_login: bool = False # 是否需要自定义登录
 
+    metrics: Metrics = metrics # 指标集合，默认为进程内共享的集合
+
+    @property
+    def stream_ttl(self) -> float:
+        """parse_stream 返回的签名地址的有效期，单位：秒；未声明时为 0，即每次使用前都应重新解析"""
+        return getattr(self.Config, 'stream_ttl', 0)
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # 只统计具体的适配器，通用适配器 Adapter 没有 adapter_name，避免重复统计
+        if not hasattr(cls.Config, 'adapter_name'):
+            return
+        for name in INSTRUMENTED_METHODS:
+            method = cls.__dict__.get(name)
+            if method is not None and inspect.iscoroutinefunction(method):
+                setattr(cls, name, _timed(name, method))
+
     @abstractmethod
-    def __init__(self, cookies: Optional[Cookies] = None):
-        """初始化适配器"""
+    def __init__(self, cookies: Optional[Cookies] = None, cache: Optional[BaseCache] = None, metrics: Optional[Metrics] = None, transport: Optional[AsyncBaseTransport] = None):
+        """初始化适配器，cache 为空时使用默认的 SQLite 缓存，metrics 为空时使用默认的指标集合，transport 为空时使用默认的共享传输层"""
         pass
 
+    async def close(self) -> None:
+        """释放适配器持有的 HTTP 客户端等资源"""
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        await self.close()
+
     @abstractmethod
     def set_cookies(self, cookies: Cookies) -> None:
         """设置 cookies"""
@@ -50,6 +108,23 @@ class BaseAdapterInterface(ABC):
         pass
 
     @abstractmethod
-    async def parse_stream(self, episode: Episode) -> Tuple[List[VideoMedia], Optional[List[AudioMedia]], Optional[List[SubtitleMedia]]]:
-        """解析剧集流，返回视频、音频、字幕流"""
-        pass
\ No newline at end of file
+    async def parse_stream(self, episode: Episode, refresh: bool = False) -> Tuple[List[VideoMedia], Optional[List[AudioMedia]], Optional[List[SubtitleMedia]]]:
+        """解析剧集流，返回视频、音频、字幕流；refresh 为 True 时不使用缓存的签名地址"""
+        pass
+
+    async def parse_season_streams(self, episodes: List[Episode], concurrency: int = 4) -> AsyncIterator[Tuple[Episode, Tuple[List[VideoMedia], Optional[List[AudioMedia]], Optional[List[SubtitleMedia]]]]]:
+        """并发解析多集的流，按完成顺序逐个返回 (剧集, (视频, 音频, 字幕))"""
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def parse(episode: Episode):
+            async with semaphore:
+                return episode, await self.parse_stream(episode)
+
+        tasks = [asyncio.ensure_future(parse(episode)) for episode in episodes]
+        try:
+            for future in asyncio.as_completed(tasks):
+                yield await future
+        finally:
+            # 调用方提前退出或出错时取消尚未完成的解析
+            for task in tasks:
+                task.cancel()
@@ -0,0 +1,114 @@
+from typing import List, Dict, Any, Optional, Tuple
+from pydantic import BaseModel
+from pathlib import Path
+from enum import Enum
+import sqlite3
+import json
+import time
+
+DEFAULT_JOURNAL_PATH = Path.home() / '.cache' / 'AniDL' / 'journal.sqlite3'
+
+class JobStatus(str, Enum):
+    """描述下载任务的状态"""
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+class JobNotFoundError(Exception):
+    """当任务不存在于任务日志中时引发的异常"""
+    def __init__(self, job_id: str):
+        message = f"任务 '{job_id}' 不存在！"
+        super().__init__(message)
+
+class Job(BaseModel):
+    """任务日志中的一条下载任务"""
+    job_id: str
+    adapter_name: str
+    episode: Dict[str, Any] # Episode 的字段
+    media: Dict[str, Any] # 选中的 VideoMedia 的字段
+    output: str
+    priority: int = 0
+    status: JobStatus = JobStatus.PENDING
+    resolved_at: float # 最近一次解析出 media 的时间，用于判断签名地址是否过期
+    error: Optional[str] = None
+
+class Journal:
+    """基于 SQLite 的下载任务日志，记录每个任务选中的媒体以及已写入的分片序号和偏移，进程中断后据此续传"""
+
+    def __init__(self, path: str | Path = DEFAULT_JOURNAL_PATH):
+        if str(path) != ':memory:':
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            'job_id TEXT PRIMARY KEY, adapter_name TEXT NOT NULL, episode TEXT NOT NULL, media TEXT NOT NULL, '
+            'output TEXT NOT NULL, priority INTEGER NOT NULL, status TEXT NOT NULL, resolved_at REAL NOT NULL, '
+            'error TEXT, created_at REAL NOT NULL)'
+        )
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS segments ('
+            'job_id TEXT NOT NULL, idx INTEGER NOT NULL, offset INTEGER NOT NULL, length INTEGER NOT NULL, '
+            'PRIMARY KEY (job_id, idx))'
+        )
+
+    def add_job(self, job_id: str, adapter_name: str, episode: Dict[str, Any], media: Dict[str, Any], output: str, priority: int = 0) -> Job:
+        """新增任务；任务已存在时只更新优先级，保留原来选中的媒体和已完成的分片以便续传"""
+        now = time.time()
+        self.conn.execute(
+            'INSERT INTO jobs (job_id, adapter_name, episode, media, output, priority, status, resolved_at, created_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (job_id) DO UPDATE SET priority = excluded.priority',
+            (job_id, adapter_name, json.dumps(episode), json.dumps(media), output, priority, JobStatus.PENDING.value, now, now)
+        )
+        return self.get_job(job_id)
+
+    def get_job(self, job_id: str) -> Job:
+        row = self.conn.execute(
+            'SELECT job_id, adapter_name, episode, media, output, priority, status, resolved_at, error FROM jobs WHERE job_id = ?', (job_id,)
+        ).fetchone()
+        if row is None:
+            raise JobNotFoundError(job_id)
+        return self._job(row)
+
+    def unfinished_jobs(self) -> List[Job]:
+        """返回所有未完成的任务（包括中断时正在运行的），按优先级从高到低"""
+        rows = self.conn.execute(
+            'SELECT job_id, adapter_name, episode, media, output, priority, status, resolved_at, error FROM jobs '
+            'WHERE status != ? ORDER BY priority DESC, created_at', (JobStatus.DONE.value,)
+        )
+        return [self._job(row) for row in rows]
+
+    def set_status(self, job_id: str, status: JobStatus, error: Optional[str] = None) -> None:
+        self.conn.execute('UPDATE jobs SET status = ?, error = ? WHERE job_id = ?', (status.value, error, job_id))
+
+    def update_media(self, job_id: str, media: Dict[str, Any]) -> None:
+        """签名地址过期重新解析后更新媒体"""
+        self.conn.execute('UPDATE jobs SET media = ?, resolved_at = ? WHERE job_id = ?', (json.dumps(media), time.time(), job_id))
+
+    def record_segment(self, job_id: str, index: int, offset: int, length: int) -> None:
+        """记录已写入输出文件的分片"""
+        self.conn.execute(
+            'INSERT OR REPLACE INTO segments (job_id, idx, offset, length) VALUES (?, ?, ?, ?)', (job_id, index, offset, length)
+        )
+
+    def completed_segments(self, job_id: str) -> Dict[int, Tuple[int, int]]:
+        """返回已写入的分片 {序号: (偏移, 长度)}"""
+        rows = self.conn.execute('SELECT idx, offset, length FROM segments WHERE job_id = ?', (job_id,))
+        return {index: (offset, length) for index, offset, length in rows}
+
+    def remove_job(self, job_id: str) -> None:
+        self.conn.execute('DELETE FROM segments WHERE job_id = ?', (job_id,))
+        self.conn.execute('DELETE FROM jobs WHERE job_id = ?', (job_id,))
+
+    @staticmethod
+    def _job(row: tuple) -> Job:
+        job_id, adapter_name, episode, media, output, priority, status, resolved_at, error = row
+        return Job(
+            job_id=job_id, adapter_name=adapter_name, episode=json.loads(episode), media=json.loads(media), output=output,
+            priority=priority, status=JobStatus(status), resolved_at=resolved_at, error=error
+        )
+
+    def close(self) -> None:
+        self.conn.close()
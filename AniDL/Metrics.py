@@ -0,0 +1,203 @@
+from typing import List, Dict, Tuple, Any, Callable, Optional, Iterator
+from contextlib import contextmanager
+from collections import deque
+import bisect
+import time
+
+Labels = Tuple[Tuple[str, str], ...]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def _escape(value: str) -> str:
+    """转义 Prometheus 标签值中的反斜杠、换行和双引号"""
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in items) + '}'
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class Histogram:
+    """固定分桶的直方图"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # 最后一个桶为 +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        cumulative = []
+        total = 0
+        for bound, count in zip(list(self.buckets) + [float('inf')], self.counts):
+            total += count
+            cumulative.append((bound, total))
+        return {'buckets': cumulative, 'sum': self.sum, 'count': self.count}
+
+class TaskProgress:
+    """单个下载任务的进度与各阶段耗时"""
+
+    def __init__(self, name: str, total_segments: int = 0, window: float = 5.0):
+        self.name = name
+        self.total_segments = total_segments
+        self.done_segments = 0
+        self.bytes = 0
+        self.started_at = time.monotonic()
+        self.finished_at: Optional[float] = None
+        self.error: Optional[str] = None # 任务失败时的错误
+        self.stage_seconds: Dict[str, float] = {'network': 0.0, 'decrypt': 0.0, 'disk': 0.0, 'throttle': 0.0} # throttle 为等待带宽限制器的时间
+        self._window = window # 计算当前速度的时间窗口，单位：秒
+        self._samples: deque = deque()
+
+    def add_bytes(self, nbytes: int) -> None:
+        now = time.monotonic()
+        self.bytes += nbytes
+        self._samples.append((now, nbytes))
+        while self._samples and self._samples[0][0] < now - self._window:
+            self._samples.popleft()
+
+    def bytes_per_second(self) -> float:
+        """最近时间窗口内的下载速度，任务结束后为平均速度"""
+        if self.finished_at is not None:
+            return self.bytes / max(self.finished_at - self.started_at, 1e-9)
+        now = time.monotonic()
+        elapsed = min(self._window, now - self.started_at)
+        recent = sum(nbytes for t, nbytes in self._samples if t >= now - self._window)
+        return recent / max(elapsed, 1e-9)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'total_segments': self.total_segments,
+            'done_segments': self.done_segments,
+            'bytes': self.bytes,
+            'bytes_per_second': self.bytes_per_second(),
+            'elapsed': (self.finished_at or time.monotonic()) - self.started_at,
+            'finished': self.finished_at is not None,
+            'error': self.error,
+            'stage_seconds': dict(self.stage_seconds),
+        }
+
+class Metrics:
+    """计数器、直方图与任务进度的集合，支持拉取快照、Prometheus 文本格式和事件回调"""
+
+    def __init__(self, prefix: str = 'anidl', max_finished_tasks: int = 100):
+        self.prefix = prefix
+        self.max_finished_tasks = max_finished_tasks # 最多保留的已结束任务数，超出时移除最早结束的
+        self.counters: Dict[str, Dict[Labels, float]] = {}
+        self.histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self.tasks: Dict[str, TaskProgress] = {}
+        self._subscribers: List[Callable[[str, Dict[str, Any]], None]] = []
+
+    def subscribe(self, callback: Callable[[str, Dict[str, Any]], None]) -> None:
+        """订阅事件，回调参数为 (事件名, 事件数据)"""
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback: Callable[[str, Dict[str, Any]], None]) -> None:
+        self._subscribers.remove(callback)
+
+    def emit(self, event: str, **data: Any) -> None:
+        for callback in self._subscribers:
+            callback(event, data)
+
+    def inc(self, name: str, value: float = 1, **labels: Any) -> None:
+        """增加计数器"""
+        series = self.counters.setdefault(name, {})
+        key = _labels(labels)
+        series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        """向直方图记录一个观测值"""
+        series = self.histograms.setdefault(name, {})
+        key = _labels(labels)
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = Histogram()
+        histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels: Any) -> Iterator[None]:
+        """计时上下文，结束时把耗时记录到直方图"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def start_task(self, name: str, total_segments: int = 0) -> TaskProgress:
+        task = self.tasks[name] = TaskProgress(name, total_segments)
+        self.emit('task_started', task=name, total_segments=total_segments)
+        return task
+
+    def finish_task(self, task: TaskProgress, error: Optional[str] = None) -> None:
+        """标记任务结束，失败时记录错误；已结束的任务只保留最近的 max_finished_tasks 个"""
+        task.finished_at = time.monotonic()
+        task.error = error
+        task._samples.clear() # 结束后速度按平均值计算，不再需要采样
+        self.emit('task_finished', task=task.name, bytes=task.bytes, elapsed=task.finished_at - task.started_at, error=error)
+        finished = [name for name, other in self.tasks.items() if other.finished_at is not None]
+        if len(finished) > self.max_finished_tasks:
+            finished.sort(key=lambda name: self.tasks[name].finished_at)
+            for name in finished[:len(finished) - self.max_finished_tasks]:
+                del self.tasks[name]
+
+    def remove_task(self, name: str) -> None:
+        """移除任务进度，长时间运行的进程应在任务结束后调用"""
+        self.tasks.pop(name, None)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """拉取当前所有指标"""
+        return {
+            'counters': {name: {labels: value for labels, value in series.items()} for name, series in self.counters.items()},
+            'histograms': {name: {labels: histogram.snapshot() for labels, histogram in series.items()} for name, series in self.histograms.items()},
+            'tasks': {name: task.snapshot() for name, task in self.tasks.items()},
+        }
+
+    def to_prometheus(self) -> str:
+        """输出 Prometheus 文本格式"""
+        lines = []
+        for name, series in self.counters.items():
+            metric = f'{self.prefix}_{name}'
+            lines.append(f'# TYPE {metric} counter')
+            for labels, value in series.items():
+                lines.append(f'{metric}{_format_labels(labels)} {_format_value(value)}')
+        for name, series in self.histograms.items():
+            metric = f'{self.prefix}_{name}'
+            lines.append(f'# TYPE {metric} histogram')
+            for labels, histogram in series.items():
+                for bound, count in histogram.snapshot()['buckets']:
+                    le = '+Inf' if bound == float('inf') else f'{bound:g}'
+                    lines.append(f'{metric}_bucket{_format_labels(labels, ("le", le))} {count}')
+                lines.append(f'{metric}_sum{_format_labels(labels)} {_format_value(histogram.sum)}')
+                lines.append(f'{metric}_count{_format_labels(labels)} {histogram.count}')
+        gauges = {
+            'task_bytes': lambda task: task.bytes,
+            'task_bytes_per_second': lambda task: task.bytes_per_second(),
+            'task_segments_done': lambda task: task.done_segments,
+            'task_segments_total': lambda task: task.total_segments,
+        }
+        for name, value in gauges.items():
+            metric = f'{self.prefix}_{name}'
+            lines.append(f'# TYPE {metric} gauge')
+            for task in self.tasks.values():
+                lines.append(f'{metric}{_format_labels((("task", task.name),))} {_format_value(value(task))}')
+        metric = f'{self.prefix}_task_stage_seconds'
+        lines.append(f'# TYPE {metric} gauge')
+        for task in self.tasks.values():
+            for stage, seconds in task.stage_seconds.items():
+                lines.append(f'{metric}{_format_labels((("stage", stage), ("task", task.name)))} {_format_value(seconds)}')
+        return '\n'.join(lines) + '\n'
+
+# 进程内默认的指标集合
+metrics = Metrics()
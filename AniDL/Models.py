@@ -69,6 +69,24 @@ class KeysMismatchError(IndexModelError):
         message = f"索引字段数量不匹配！预期: {expected}，提供: {provided}。"
         super().__init__(message)
 
+class MissingValueError(IndexModelError):
+    """当批量构造时缺少必填字段的值时引发的异常"""
+    def __init__(self, field_name: str):
+        message = f"字段 '{field_name}' 缺少值。"
+        super().__init__(message)
+
+class SecondaryIndexNotFoundError(IndexModelError):
+    """当查询的字段组合未声明为二级索引时引发的异常"""
+    def __init__(self, field_names: Tuple[str, ...], class_name: str):
+        message = f"{class_name} 类未声明二级索引 {field_names}，请用 @secondary_index 装饰器标记！"
+        super().__init__(message)
+
+
+def _ensure_index_config(cls: Type['IndexBaseModel']) -> None:
+    """给cls添加一个新的Config类"""
+    if not hasattr(cls.Config, 'index_fields'):
+        setattr(cls, 'Config', type('Config', (), {'instances': {}, 'index_fields': [], 'secondary_indexes': [], 'secondary_instances': {}}))
+
 
 def index_field(*field_names):
     """装饰器，用于标记索引字段"""
@@ -79,9 +97,7 @@ def index_field(*field_names):
             raise FieldNameTypeError(field_name)
     
     def decorator(cls: Type[IndexBaseModel]):
-        # 给cls添加一个新的Config类
-        if not hasattr(cls.Config, 'index_fields'):
-            setattr(cls, 'Config', type('Config', (), {'instances': {}, 'index_fields': []}))
+        _ensure_index_config(cls)
         # 检查字段是否在模型中
         for field_name in field_names:
             if field_name not in cls.__fields__:
@@ -94,6 +110,25 @@ def index_field(*field_names):
         return cls
     return decorator
 
+def secondary_index(*field_names):
+    """装饰器，用于声明二级索引，可按这些字段的值直接查出所有匹配的实例"""
+    if not field_names:
+        raise EmptyFieldNamesError()
+    for field_name in field_names:
+        if not isinstance(field_name, str):
+            raise FieldNameTypeError(field_name)
+
+    def decorator(cls: Type[IndexBaseModel]):
+        _ensure_index_config(cls)
+        for field_name in field_names:
+            if field_name not in cls.__fields__:
+                raise MissingFieldError(field_name)
+        if field_names in cls.Config.secondary_indexes:
+            raise DuplicateFieldError(', '.join(field_names))
+        cls.Config.secondary_indexes = cls.Config.secondary_indexes + [field_names]
+        return cls
+    return decorator
+
 class IndexBaseModel(BaseModel):
     """带索引功能的基础模型"""
 
@@ -102,19 +137,116 @@ class IndexBaseModel(BaseModel):
     class Config:
         instances: Dict[str, Dict[Tuple[Any, ...], weakref.ref]]
         index_fields: List[str]
+        secondary_indexes: List[Tuple[str, ...]]
+        # 命名空间 -> 二级索引字段 -> 二级索引值 -> 主索引值 -> 弱引用
+        secondary_instances: Dict[str, Dict[Tuple[str, ...], Dict[Tuple[Any, ...], Dict[Tuple[Any, ...], weakref.ref]]]]
 
     def __init__(self, **data: Any):
-        super().__init__(**data)
+        super().__init__(**self._prepare_data(data))
         # 检查Config类中是否存在index_fields属性
         if not hasattr(self.__class__.Config, 'index_fields'):
             raise NoIndexFieldsError(self.__class__.__name__)
-        # 自动存储实例到类变量
+        self._register()
+
+    @classmethod
+    def _prepare_data(cls, data: Dict[str, Any]) -> Dict[str, Any]:
+        """构造实例前补全字段，子类可重写"""
+        return data
+
+    @classmethod
+    def construct_many(cls: Type['IndexBaseModel'], records: List[Dict[str, Any]], namespace: str = "global") -> List['IndexBaseModel']:
+        """批量构造实例并登记到索引中，跳过 pydantic 校验，仅用于字段类型已确定的数据"""
+        if not hasattr(cls.Config, 'index_fields') or not cls.Config.index_fields:
+            raise NoIndexFieldsError(cls.__name__)
+        config = cls.Config
+        template, required, factories = cls._trusted_template()
+        rows = []
+        for record in records:
+            data = cls._prepare_data(dict(record, namespace=namespace))
+            values = template.copy()
+            values.update(data)
+            if len(data) < len(required) or not required.issubset(data):
+                raise MissingValueError(next(name for name in required if name not in data))
+            for name, factory in factories:
+                if name not in data:
+                    values[name] = factory()
+            rows.append((data, values, tuple(values[field] for field in config.index_fields)))
+        # 先检查重复，避免登记到一半时出错导致索引不一致
+        namespace_instances = config.instances.get(namespace, {})
+        seen = set()
+        for _, _, key_values in rows:
+            existing = namespace_instances.get(key_values)
+            if key_values in seen or (existing is not None and existing() is not None):
+                raise InstanceAlreadyExistsError(key_values, namespace)
+            seen.add(key_values)
+        instances = []
+        setattr_ = object.__setattr__
+        for data, values, key_values in rows:
+            instance = cls.__new__(cls)
+            setattr_(instance, '__dict__', values)
+            setattr_(instance, '__pydantic_fields_set__', set(data))
+            setattr_(instance, '__pydantic_extra__', None)
+            setattr_(instance, '__pydantic_private__', None)
+            secondary_values = [(fields, tuple(values[field] for field in fields)) for fields in config.secondary_indexes]
+            cls._store(instance, namespace, key_values, secondary_values)
+            instances.append(instance)
+        return instances
+
+    @classmethod
+    def _trusted_template(cls) -> Tuple[Dict[str, Any], set, List[Tuple[str, Any]]]:
+        """返回 (按字段顺序排列的默认值, 必填字段, default_factory 字段)，每个类只解析一次"""
+        cached = cls.__dict__.get('_trusted_template_cache')
+        if cached is None:
+            template, required, factories = {}, set(), []
+            for name, field in cls.model_fields.items():
+                # 先占位以保持字段顺序，与正常构造的实例一致
+                template[name] = None if field.is_required() or field.default_factory is not None else field.default
+                if field.is_required():
+                    required.add(name)
+                elif field.default_factory is not None:
+                    factories.append((name, field.default_factory))
+            cached = (template, required, factories)
+            cls._trusted_template_cache = cached
+        return cached
+
+    def _register(self) -> None:
+        """自动存储实例到类变量，实例被回收时自动移除"""
+        config = self.__class__.Config
         key_values = self._get_index_values()
-        namespace_instances = self.__class__.Config.instances.setdefault(self.namespace, {})
+        namespace_instances = config.instances.get(self.namespace, {})
         if key_values in namespace_instances and namespace_instances[key_values]() is not None:
             raise InstanceAlreadyExistsError(key_values, self.namespace)
-        # 使用弱引用保存实例
-        namespace_instances[key_values] = weakref.ref(self)
+        secondary_values = [(fields, tuple(getattr(self, field) for field in fields)) for fields in config.secondary_indexes]
+        self._store(self, self.namespace, key_values, secondary_values)
+
+    @classmethod
+    def _store(cls, instance: 'IndexBaseModel', namespace: str, key_values: Tuple[Any, ...], secondary_values: List[Tuple[Tuple[str, ...], Tuple[Any, ...]]]) -> None:
+        """以弱引用登记实例的主索引和二级索引，调用方需已检查重复"""
+        config = cls.Config
+        instance_ref = weakref.ref(instance, cls._make_remover(config, namespace, key_values, secondary_values))
+        config.instances.setdefault(namespace, {})[key_values] = instance_ref
+        if secondary_values:
+            namespace_secondary = config.secondary_instances.setdefault(namespace, {})
+            for fields, values in secondary_values:
+                namespace_secondary.setdefault(fields, {}).setdefault(values, {})[key_values] = instance_ref
+
+    @staticmethod
+    def _make_remover(config: type, namespace: str, key_values: Tuple[Any, ...], secondary_values: List[Tuple[Tuple[str, ...], Tuple[Any, ...]]]):
+        """生成弱引用回调，回调中不能持有实例本身"""
+        def remove(instance_ref: weakref.ref) -> None:
+            namespace_instances = config.instances.get(namespace)
+            # 同一索引可能已被新实例占用，只移除自己的弱引用
+            if namespace_instances is not None and namespace_instances.get(key_values) is instance_ref:
+                del namespace_instances[key_values]
+            namespace_secondary = config.secondary_instances.get(namespace, {})
+            for fields, values in secondary_values:
+                buckets = namespace_secondary.get(fields, {})
+                bucket = buckets.get(values)
+                if bucket is not None and bucket.get(key_values) is instance_ref:
+                    del bucket[key_values]
+                    if not bucket:
+                        del buckets[values]
+        return remove
     
     def _get_index_values(self) -> Tuple[Any, ...]:
         """获取索引字段的值"""
@@ -125,18 +257,33 @@ class IndexBaseModel(BaseModel):
     
     @classmethod
     def get_instances(cls, namespace: str = "global") -> Dict[Tuple[Any, ...], weakref.ref]:
-        """获取命名空间中的实例字典"""
-        return cls.Config.instances.get(namespace, {})
+        """获取命名空间中的实例字典（快照，遍历时不受实例回收影响）"""
+        return dict(cls.Config.instances.get(namespace, {}))
     
     @classmethod
     def clear_instances(cls, namespace: str = "global"):
         """清空命名空间中的所有实例"""
         cls.Config.instances[namespace].clear()
+        cls.Config.secondary_instances.pop(namespace, None)
 
     @classmethod
     def clear_all_instances(cls):
         """清空所有命名空间中的实例"""
         cls.Config.instances.clear()
+        cls.Config.secondary_instances.clear()
+
+    @classmethod
+    def find(cls: Type['IndexBaseModel'], namespace: str = "global", **field_values: Any) -> List['IndexBaseModel']:
+        """通过二级索引获取所有匹配的实例"""
+        if not field_values:
+            raise EmptyKeysError()
+        fields = tuple(field_values)
+        if fields not in cls.Config.secondary_indexes:
+            raise SecondaryIndexNotFoundError(fields, cls.__name__)
+        values = tuple(field_values[field] for field in fields)
+        bucket = cls.Config.secondary_instances.get(namespace, {}).get(fields, {}).get(values, {})
+        instances = [instance_ref() for instance_ref in list(bucket.values())]
+        return [instance for instance in instances if instance is not None]
     
     @classmethod
     def get(cls: Type['IndexBaseModel'], *keys, namespace: str = "global") -> 'IndexBaseModel':
@@ -145,7 +292,8 @@ class IndexBaseModel(BaseModel):
             raise EmptyKeysError()
         if len(keys) != len(cls.Config.index_fields):
             raise KeysMismatchError(len(cls.Config.index_fields), len(keys))
-        namespace_instances = cls.get_instances(namespace)
+        # 直接查原字典，get_instances 的复制只用于遍历
+        namespace_instances = cls.Config.instances.get(namespace, {})
         try:
             instance_ref = namespace_instances[keys]
             instance_ref = instance_ref()
@@ -161,6 +309,7 @@ class Season(IndexBaseModel):
     season_id: int
     season_title: str
 
+@secondary_index('season_id')
 @index_field('episode_id')
 class Episode(IndexBaseModel):
     """描述剧集的集信息"""
@@ -211,6 +360,7 @@ class Media(IndexBaseModel):
     biterate: Optional[int] = None # 比特率，单位：bps
     drm_type: Optional[DRMType] = None
     drm_info: Optional[dict] = None # 可能的值：key, iv, license_url, license_headers, cene
+    representation_id: Optional[str] = None # file_type 为 MPD 时要下载的 Representation
 
 resolution_to_quality = {
     (3840, 2160): "4K",
@@ -222,6 +372,7 @@ resolution_to_quality = {
     (426, 240): "240P",
 }
 
+@secondary_index('episode_id')
 @index_field('episode_id', 'quality', 'codec')
 class VideoMedia(Media):
     """描述视频媒体资源信息"""
@@ -229,11 +380,14 @@ class VideoMedia(Media):
     height: int
     codec: Optional[str] = None
     quality: Optional[str] = None
-    def __init__(self, **data):
+
+    @classmethod
+    def _prepare_data(cls, data: Dict[str, Any]) -> Dict[str, Any]:
         if data.get('quality') is None:
             data['quality'] = resolution_to_quality.get((data.get('width'), data.get('height')), "未知")
-        super().__init__(**data)
+        return data
 
+@secondary_index('episode_id')
 @index_field('episode_id', 'language', 'codec')
 class AudioMedia(Media):
     """描述音频媒体资源信息"""
@@ -245,6 +399,7 @@ class SubtitleType(str, Enum):
     SRT = "srt"
     ASS = "ass"
 
+@secondary_index('episode_id')
 @index_field('episode_id', 'language', 'subtitle_type')
 class SubtitleMedia(Media):
     """描述字幕媒体资源信息"""
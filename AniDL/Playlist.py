@@ -0,0 +1,140 @@
+from typing import List, Dict, Optional, Tuple
+from urllib.parse import urljoin
+from pydantic import BaseModel
+import re
+
+# 属性列表中的 KEY=VALUE，值可能是带逗号的引号字符串
+_ATTRIBUTE = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)')
+
+class SegmentKey(BaseModel):
+    """描述分片的加密信息（#EXT-X-KEY）"""
+    method: str
+    url: Optional[str] = None
+    iv: Optional[str] = None # 十六进制字符串，如 0x0000...0001
+
+class Segment(BaseModel):
+    """描述媒体播放列表中的一个分片"""
+    index: int # 分片在播放列表中的序号
+    url: str
+    sequence: int = 0 # 媒体序列号，未指定 IV 时用作 IV
+    duration: Optional[float] = None # 分片时长，单位：秒
+    byte_range: Optional[Tuple[int, int]] = None # (长度, 偏移)
+    key: Optional[SegmentKey] = None
+
+class Variant(BaseModel):
+    """主播放列表中的一个子播放列表（#EXT-X-STREAM-INF）"""
+    url: str
+    bandwidth: Optional[int] = None
+
+def parse_attributes(text: str) -> Dict[str, str]:
+    """解析属性列表，去掉值两侧的引号"""
+    return {name: value[1:-1] if value[:1] == '"' else value for name, value in _ATTRIBUTE.findall(text)}
+
+class PlaylistParser:
+    """增量解析 HLS 播放列表：数据到达即可喂入，每读到一个完整的分片就返回，无需等待整个播放列表
+
+    与 m3u8 库的解析结果一致：URI 按 urljoin(播放列表地址, '.') 解析为绝对地址，#EXT-X-KEY 对其后的分片持续生效，
+    只有跟在 #EXTINF 或 #EXT-X-BYTERANGE 之后的 URI 才是分片。#EXT-X-BYTERANGE 省略偏移时按规范取同一资源上一个范围的结尾。
+    遇到 #EXT-X-STREAM-INF 时视为主播放列表，子播放列表收集在 variants 中。
+    """
+
+    def __init__(self, url: str):
+        self.base_url = urljoin(url, '.')
+        self.media_sequence = 0
+        self.is_variant = False
+        self.is_endlist = False
+        self.variants: List[Variant] = []
+        self._index = 0
+        self._key: Optional[SegmentKey] = None
+        self._duration: Optional[float] = None
+        self._byte_range: Optional[Tuple[int, Optional[int]]] = None
+        self._expect_segment = False
+        self._expect_variant = False
+        self._variant_bandwidth: Optional[int] = None
+        self._range_end: Dict[str, int] = {} # 资源地址 -> 上一个字节范围的结尾
+        self._partial = '' # 上次喂入时不完整的最后一行
+
+    def feed(self, text: str) -> List[Segment]:
+        """喂入一段文本（可在任意位置截断），返回其中完整的分片"""
+        lines = (self._partial + text).split('\n')
+        self._partial = lines.pop()
+        segments = []
+        for line in lines:
+            segment = self.feed_line(line)
+            if segment is not None:
+                segments.append(segment)
+        return segments
+
+    def close(self) -> List[Segment]:
+        """数据结束，解析剩余的最后一行"""
+        line, self._partial = self._partial, ''
+        segment = self.feed_line(line) if line else None
+        return [segment] if segment is not None else []
+
+    def feed_line(self, line: str) -> Optional[Segment]:
+        """解析一行，若该行完成了一个分片则返回该分片"""
+        line = line.strip()
+        if not line:
+            return None
+        if not line.startswith('#'):
+            if self._expect_segment:
+                return self._segment(line)
+            if self._expect_variant:
+                self.variants.append(Variant(url=urljoin(self.base_url, line), bandwidth=self._variant_bandwidth))
+                self._expect_variant = False
+            return None
+        tag, _, value = line.partition(':')
+        if tag == '#EXTINF':
+            self._duration = float(value.split(',', 1)[0])
+            self._expect_segment = True
+        elif tag == '#EXT-X-BYTERANGE':
+            length, _, offset = value.partition('@')
+            self._byte_range = (int(length), int(offset) if offset else None)
+            self._expect_segment = True
+        elif tag == '#EXT-X-KEY':
+            attributes = parse_attributes(value)
+            method = attributes.get('METHOD')
+            uri = attributes.get('URI')
+            if method is None or method == 'NONE':
+                self._key = None
+            else:
+                self._key = SegmentKey(method=method, url=urljoin(self.base_url, uri) if uri is not None else None, iv=attributes.get('IV'))
+        elif tag == '#EXT-X-MEDIA-SEQUENCE':
+            self.media_sequence = int(value)
+        elif tag == '#EXT-X-ENDLIST':
+            self.is_endlist = True
+        elif tag == '#EXT-X-STREAM-INF':
+            self.is_variant = True
+            bandwidth = parse_attributes(value).get('BANDWIDTH')
+            self._variant_bandwidth = int(float(bandwidth)) if bandwidth else None
+            self._expect_variant = True
+        return None
+
+    def _segment(self, uri: str) -> Segment:
+        url = urljoin(self.base_url, uri)
+        byte_range = None
+        if self._byte_range is not None:
+            length, offset = self._byte_range
+            if offset is None:
+                offset = self._range_end.get(url, 0)
+            self._range_end[url] = offset + length
+            byte_range = (length, offset)
+        segment = Segment(
+            index=self._index,
+            url=url,
+            sequence=self.media_sequence + self._index,
+            duration=self._duration,
+            byte_range=byte_range,
+            key=self._key
+        )
+        self._index += 1
+        self._duration = None
+        self._byte_range = None
+        self._expect_segment = False
+        return segment
+
+    def best_variant(self) -> Optional[Variant]:
+        """码率最高的子播放列表，码率相同时取先出现的"""
+        if not self.variants:
+            return None
+        return max(self.variants, key=lambda variant: variant.bandwidth or 0)
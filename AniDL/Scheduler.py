@@ -0,0 +1,173 @@
+from AniDL.Models import Episode, VideoMedia, IndexModelError
+from AniDL.Interfaces import BaseAdapterInterface
+from AniDL.Journal import Journal, Job, JobStatus
+from AniDL.utils import Downloader
+from typing import Dict, Optional, Set, Callable
+from httpx import HTTPStatusError
+from pathlib import Path
+import asyncio
+import time
+
+class MediaNotResolvedError(Exception):
+    """当重新解析后找不到与任务相同规格的媒体时引发的异常"""
+    def __init__(self, job_id: str, quality: Optional[str]):
+        message = f"任务 '{job_id}' 重新解析后找不到画质为 {quality} 的媒体！"
+        super().__init__(message)
+
+class AdapterNotConfiguredError(Exception):
+    """当任务所需的适配器既未提供也无法由 adapter_factory 创建时引发的异常"""
+    def __init__(self, adapter_name: str):
+        message = f"没有可用的适配器 '{adapter_name}'，请通过 adapters 或 adapter_factory 提供带登录状态的适配器！"
+        super().__init__(message)
+
+class DownloadScheduler:
+    """多剧集下载调度器：按优先级调度，限制全局与每个适配器的并发任务数，借助任务日志断点续传"""
+
+    def __init__(self, downloader: Downloader, journal: Journal, adapters: Optional[Dict[str, BaseAdapterInterface]] = None, max_jobs: int = 4, max_jobs_per_adapter: int = 2, adapter_factory: Optional[Callable[[str], BaseAdapterInterface]] = None):
+        self.downloader = downloader
+        self.journal = journal
+        self.adapters = adapters if adapters is not None else {}
+        # 按名称创建适配器，如 lambda name: Adapter(name, cookies=cookies)；重启后续传日志中的任务时用它创建带登录状态的适配器
+        self.adapter_factory = adapter_factory
+        self.max_jobs = max_jobs # 全局同时运行的任务数
+        self.max_jobs_per_adapter = max_jobs_per_adapter # 每个适配器同时运行的任务数
+        self._queue: Dict[str, Job] = {}
+        self._running: Dict[str, str] = {} # 任务ID -> 适配器名
+        self._seq: Dict[str, int] = {} # 同优先级时先提交的先运行
+        self._condition = asyncio.Condition()
+        self._created_adapters: Set[str] = set() # 由调度器创建、需要由调度器关闭的适配器
+
+    def get_adapter(self, adapter_name: str) -> BaseAdapterInterface:
+        """获取适配器实例，未提供时用 adapter_factory 创建
+
+        不会自行创建未登录的适配器：匿名请求拿不到会员的播放地址，重新解析只会失败。
+        """
+        adapter = self.adapters.get(adapter_name)
+        if adapter is None:
+            if self.adapter_factory is None:
+                raise AdapterNotConfiguredError(adapter_name)
+            adapter = self.adapters[adapter_name] = self.adapter_factory(adapter_name)
+            self._created_adapters.add(adapter_name)
+        return adapter
+
+    def _check_adapter(self, adapter_name: str) -> None:
+        if adapter_name not in self.adapters and self.adapter_factory is None:
+            raise AdapterNotConfiguredError(adapter_name)
+
+    async def close(self) -> None:
+        """关闭由调度器创建的适配器"""
+        for adapter_name in self._created_adapters:
+            await self.adapters.pop(adapter_name).close()
+        self._created_adapters.clear()
+
+    def submit(self, adapter_name: str, episode: Episode, media: VideoMedia, output: str, priority: int = 0) -> Job:
+        """提交下载任务，输出路径即任务ID；同一输出路径重复提交时沿用任务日志中的进度"""
+        self._check_adapter(adapter_name)
+        output = str(Path(output).resolve())
+        job = self.journal.add_job(output, adapter_name, episode.model_dump(mode='json'), media.model_dump(mode='json'), output, priority)
+        self._enqueue(job)
+        return job
+
+    def _enqueue(self, job: Job) -> None:
+        if job.status == JobStatus.DONE or job.job_id in self._running:
+            return
+        self._queue[job.job_id] = job
+        self._seq.setdefault(job.job_id, len(self._seq))
+
+    def _next_job(self) -> Optional[Job]:
+        """选出优先级最高、且所属适配器还有空闲并发额度的任务"""
+        if len(self._running) >= self.max_jobs:
+            return None
+        busy: Dict[str, int] = {}
+        for adapter_name in self._running.values():
+            busy[adapter_name] = busy.get(adapter_name, 0) + 1
+        candidates = [job for job in self._queue.values() if busy.get(job.adapter_name, 0) < self.max_jobs_per_adapter]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda job: (-job.priority, self._seq[job.job_id]))
+
+    async def run(self) -> Dict[str, JobStatus]:
+        """运行所有已提交的任务以及任务日志中未完成的任务，直到全部结束，返回各任务的最终状态"""
+        unfinished = self.journal.unfinished_jobs()
+        # 在开始任何任务之前检查，而不是让续传的任务逐个失败
+        for job in unfinished:
+            self._check_adapter(job.adapter_name)
+        for job in unfinished:
+            self._enqueue(job)
+        results: Dict[str, JobStatus] = {}
+        tasks: Set[asyncio.Task] = set()
+        async with self._condition:
+            while self._queue or self._running:
+                job = self._next_job()
+                if job is None:
+                    await self._condition.wait()
+                    continue
+                del self._queue[job.job_id]
+                self._running[job.job_id] = job.adapter_name
+                task = asyncio.ensure_future(self._run_job(job, results))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        return results
+
+    async def _run_job(self, job: Job, results: Dict[str, JobStatus]) -> None:
+        self.journal.set_status(job.job_id, JobStatus.RUNNING)
+        try:
+            await self._download(job)
+        except asyncio.CancelledError:
+            # 被取消时保持可续传的状态
+            self.journal.set_status(job.job_id, JobStatus.PENDING)
+            raise
+        except Exception as e:
+            self.journal.set_status(job.job_id, JobStatus.FAILED, repr(e))
+            results[job.job_id] = JobStatus.FAILED
+        else:
+            self.journal.set_status(job.job_id, JobStatus.DONE)
+            results[job.job_id] = JobStatus.DONE
+        finally:
+            # 任务状态已记录在任务日志中，不再保留进度，避免长时间运行时不断增长
+            self.downloader.metrics.remove_task(job.output)
+            async with self._condition:
+                del self._running[job.job_id]
+                self._condition.notify_all()
+
+    async def _download(self, job: Job) -> None:
+        adapter = self.get_adapter(job.adapter_name)
+        media = job.media
+        if time.time() - job.resolved_at > adapter.stream_ttl:
+            # 签名地址可能已过期，先重新解析
+            media = await self._resolve(job, adapter)
+        for attempt in range(2):
+            try:
+                await self.downloader.download(
+                    VideoMedia.model_construct(**media),
+                    job.output,
+                    completed=self.journal.completed_segments(job.job_id),
+                    on_segment=lambda index, offset, length: self.journal.record_segment(job.job_id, index, offset, length)
+                )
+                return
+            except HTTPStatusError as e:
+                # 播放列表被拒绝通常是签名过期，重新解析一次后重试
+                if attempt or e.response.status_code not in (401, 403, 404, 410):
+                    raise
+                # 缓存中的签名地址就是被拒绝的那个，必须绕过缓存
+                media = await self._resolve(job, adapter, refresh=True)
+
+    async def _resolve(self, job: Job, adapter: BaseAdapterInterface, refresh: bool = False) -> dict:
+        """重新调用 parse_stream，选出与任务画质、编码相同的媒体并更新任务日志"""
+        episode = self._episode(job)
+        video_medias, _, _ = await adapter.parse_stream(episode, refresh)
+        for video_media in video_medias:
+            if video_media.quality == job.media.get('quality') and video_media.codec == job.media.get('codec'):
+                media = video_media.model_dump(mode='json')
+                self.journal.update_media(job.job_id, media)
+                job.media = media
+                return media
+        raise MediaNotResolvedError(job.job_id, job.media.get('quality'))
+
+    @staticmethod
+    def _episode(job: Job) -> Episode:
+        """优先使用已登记的 Episode 实例，否则构造一个不登记的临时实例"""
+        try:
+            return Episode.get(job.episode['episode_id'], namespace=job.episode.get('namespace', 'global'))
+        except IndexModelError:
+            return Episode.model_construct(**job.episode)
@@ -0,0 +1,115 @@
+from AniDL.Models import IndexBaseModel
+from typing import List, Dict, Optional, Type
+from enum import Enum
+from pathlib import Path
+import pickle
+import struct
+import io
+import os
+
+# 文件格式：8 字节魔数 + 2 字节版本号（大端）+ pickle 协议 5 的数据
+SNAPSHOT_MAGIC = b'ANIDLREG'
+SNAPSHOT_VERSION = 1
+_HEADER = struct.Struct('>8sH')
+
+class SnapshotError(Exception):
+    """基础异常类，用于注册表快照相关的错误"""
+    def __init__(self, message: str):
+        super().__init__(message)
+
+class SnapshotVersionError(SnapshotError):
+    """当快照文件不是注册表快照或版本不受支持时引发的异常"""
+    def __init__(self, path: str, version: Optional[int]):
+        message = f"不支持的快照文件：{path}" + (f"（版本 {version}，当前支持 {SNAPSHOT_VERSION}）" if version is not None else "")
+        super().__init__(message)
+
+class UnknownModelError(SnapshotError):
+    """当快照中的模型类在当前进程中不存在时引发的异常"""
+    def __init__(self, model_name: str):
+        message = f"快照中的模型 '{model_name}' 不存在，请先导入定义它的模块！"
+        super().__init__(message)
+
+def _model_name(cls: Type[IndexBaseModel]) -> str:
+    return f"{cls.__module__}.{cls.__qualname__}"
+
+def _indexed_models() -> Dict[str, Type[IndexBaseModel]]:
+    """返回所有声明了索引字段的 IndexBaseModel 子类"""
+    models = {}
+    pending = list(IndexBaseModel.__subclasses__())
+    while pending:
+        cls = pending.pop()
+        pending.extend(cls.__subclasses__())
+        if getattr(cls.Config, 'index_fields', None):
+            models[_model_name(cls)] = cls
+    return models
+
+class _SnapshotUnpickler(pickle.Unpickler):
+    """只允许还原模型字段中用到的枚举类型，快照文件无法借此执行任意代码"""
+
+    def find_class(self, module: str, name: str):
+        if module.startswith('AniDL.'):
+            cls = super().find_class(module, name)
+            if isinstance(cls, type) and issubclass(cls, Enum):
+                return cls
+        raise pickle.UnpicklingError(f"快照中不允许出现 {module}.{name}")
+
+def dump_registry(path: str | Path, namespace: str = "global", models: Optional[List[Type[IndexBaseModel]]] = None) -> int:
+    """把命名空间中仍存活的实例写入快照文件，返回写入的实例数；models 为空时包括所有带索引的模型
+
+    每个模型按列存储：字段名只写一次，每个实例是一个值元组。写入临时文件后再替换，读者不会看到写了一半的文件。
+    """
+    payload = {'namespace': namespace, 'models': {}}
+    count = 0
+    for cls in models if models is not None else _indexed_models().values():
+        fields = list(cls.model_fields)
+        rows = []
+        for instance_ref in cls.get_instances(namespace).values():
+            instance = instance_ref()
+            if instance is not None:
+                values = instance.__dict__
+                rows.append(tuple(values[field] for field in fields))
+        if rows:
+            payload['models'][_model_name(cls)] = {'fields': fields, 'rows': rows}
+            count += len(rows)
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + '.tmp')
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION))
+            pickle.dump(payload, f, protocol=5)
+        os.replace(tmp, path)
+    except BaseException:
+        # 序列化失败（如字段值不可 pickle）时不留下写了一半的临时文件
+        tmp.unlink(missing_ok=True)
+        raise
+    return count
+
+def load_registry(path: str | Path, namespace: Optional[str] = None) -> List[IndexBaseModel]:
+    """读取快照文件并把实例登记到 namespace（为空时使用快照中的命名空间），返回所有实例
+
+    注册表只保存弱引用，调用方需持有返回的列表，否则实例会被立即回收。
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < _HEADER.size:
+        raise SnapshotVersionError(str(path), None)
+    magic, version = _HEADER.unpack_from(data)
+    if magic != SNAPSHOT_MAGIC:
+        raise SnapshotVersionError(str(path), None)
+    if version != SNAPSHOT_VERSION:
+        raise SnapshotVersionError(str(path), version)
+    payload = _SnapshotUnpickler(io.BytesIO(memoryview(data)[_HEADER.size:])).load()
+    namespace = namespace if namespace is not None else payload['namespace']
+    known = _indexed_models()
+    for model_name in payload['models']:
+        if model_name not in known:
+            raise UnknownModelError(model_name)
+    instances = []
+    for model_name, table in payload['models'].items():
+        cls = known[model_name]
+        # 模型后来删除的字段直接丢弃，新增的字段使用默认值
+        columns = [(position, field) for position, field in enumerate(table['fields']) if field in cls.model_fields and field != 'namespace']
+        records = [{field: row[position] for position, field in columns} for row in table['rows']]
+        instances.extend(cls.construct_many(records, namespace=namespace))
+    return instances
@@ -0,0 +1,295 @@
+from typing import List, Dict, Tuple, Optional, Iterable, Iterator, AsyncIterator
+from httpx import AsyncClient, AsyncBaseTransport, AsyncByteStream, Request, Response, URL, create_ssl_context
+from contextlib import contextmanager
+from pydantic import BaseModel
+import urllib.request
+import importlib.util
+import httpx
+import ssl
+import ipaddress
+import asyncio
+import socket
+import time
+import httpcore
+
+# h2 未安装时退回 HTTP/1.1
+HTTP2_AVAILABLE = importlib.util.find_spec('h2') is not None
+# SOCKS 代理需要 socksio
+SOCKS_AVAILABLE = importlib.util.find_spec('socksio') is not None
+# 请求扩展中的标记，为 False 时该请求只使用 HTTP/1.1 连接池
+HTTP2_EXTENSION = 'anidl.http2'
+
+class TransportConfig(BaseModel):
+    """共享传输层的配置"""
+    http2: bool = True # 对支持的主机（HTTPS + ALPN）启用 HTTP/2 多路复用
+    max_connections_per_host: int = 8 # 每个主机的最大连接数
+    max_keepalive_per_host: int = 8 # 每个主机保持的空闲连接数
+    keepalive_expiry: float = 60.0 # 空闲连接的保持时间，单位：秒
+    host_limits: Dict[str, int] = {} # 按主机覆盖最大连接数
+    dns_ttl: float = 300.0 # DNS 解析结果的缓存时间，单位：秒
+    retries: int = 1 # 建立连接失败时的重试次数
+    proxy: Optional[str] = None # 所有请求使用的代理，优先于环境变量
+    trust_env: bool = True # 未指定 proxy 时读取 HTTP(S)_PROXY、ALL_PROXY 和 NO_PROXY 环境变量
+
+class DNSCache:
+    """缓存 DNS 解析结果，同一主机的并发解析只查询一次
+
+    查询在独立的任务中进行，某个调用方被取消或超时不会影响其他等待同一结果的调用方。
+    """
+
+    def __init__(self, ttl: float = 300.0):
+        self.ttl = ttl
+        self._entries: Dict[Tuple[str, int], Tuple[float, List[str]]] = {}
+        self._pending: Dict[Tuple[str, int], asyncio.Task] = {}
+
+    async def resolve(self, host: str, port: int, timeout: Optional[float] = None) -> List[str]:
+        """解析主机名，超过 timeout 秒时引发 httpcore.ConnectTimeout，解析失败时引发 httpcore.ConnectError"""
+        try:
+            ipaddress.ip_address(host)
+            return [host]
+        except ValueError:
+            pass
+        key = (host, port)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        task = self._pending.get(key)
+        if task is None:
+            task = self._pending[key] = asyncio.create_task(self._lookup(host, port))
+            task.add_done_callback(lambda task: self._lookup_done(key, task))
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            raise httpcore.ConnectTimeout(f"DNS lookup for {host} timed out after {timeout}s") from None
+
+    async def _lookup(self, host: str, port: int) -> List[str]:
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except socket.gaierror as e:
+            raise httpcore.ConnectError(f"DNS lookup for {host} failed: {e}") from e
+        # 保持系统返回的顺序并去重
+        addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        self._entries[(host, port)] = (time.monotonic() + self.ttl, addresses)
+        return addresses
+
+    def _lookup_done(self, key: Tuple[str, int], task: asyncio.Task) -> None:
+        if self._pending.get(key) is task:
+            del self._pending[key]
+        if not task.cancelled():
+            task.exception() # 所有等待者都已超时离开时避免 "exception was never retrieved"
+
+    def invalidate(self, host: str, port: int) -> None:
+        self._entries.pop((host, port), None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+class CachingNetworkBackend(httpcore.AsyncNetworkBackend):
+    """先查 DNS 缓存再建立 TCP 连接，依次尝试解析出的地址；TLS 的 SNI 仍使用原主机名"""
+
+    def __init__(self, backend: httpcore.AsyncNetworkBackend, dns_cache: DNSCache):
+        self.backend = backend
+        self.dns_cache = dns_cache
+
+    async def connect_tcp(self, host: str, port: int, timeout: Optional[float] = None, local_address: Optional[str] = None, socket_options: Optional[Iterable] = None) -> httpcore.AsyncNetworkStream:
+        # DNS 解析和建立 TCP 连接共用 connect 超时
+        started = time.monotonic()
+        addresses = await self.dns_cache.resolve(host, port, timeout)
+        if timeout is not None:
+            timeout = max(0.0, timeout - (time.monotonic() - started))
+        error = None
+        for address in addresses:
+            try:
+                return await self.backend.connect_tcp(address, port, timeout=timeout, local_address=local_address, socket_options=socket_options)
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as e:
+                error = e
+        # 所有地址都连不上时丢弃缓存，下次重新解析
+        self.dns_cache.invalidate(host, port)
+        raise error
+
+    async def connect_unix_socket(self, path: str, timeout: Optional[float] = None, socket_options: Optional[Iterable] = None) -> httpcore.AsyncNetworkStream:
+        return await self.backend.connect_unix_socket(path, timeout=timeout, socket_options=socket_options)
+
+    async def sleep(self, seconds: float) -> None:
+        await self.backend.sleep(seconds)
+
+# httpcore 异常 -> httpx 异常，按从具体到一般排列，取第一个匹配的
+_EXCEPTIONS = [
+    (httpcore.ConnectTimeout, httpx.ConnectTimeout),
+    (httpcore.ReadTimeout, httpx.ReadTimeout),
+    (httpcore.WriteTimeout, httpx.WriteTimeout),
+    (httpcore.PoolTimeout, httpx.PoolTimeout),
+    (httpcore.TimeoutException, httpx.TimeoutException),
+    (httpcore.ConnectError, httpx.ConnectError),
+    (httpcore.ReadError, httpx.ReadError),
+    (httpcore.WriteError, httpx.WriteError),
+    (httpcore.NetworkError, httpx.NetworkError),
+    (httpcore.ProxyError, httpx.ProxyError),
+    (httpcore.UnsupportedProtocol, httpx.UnsupportedProtocol),
+    (httpcore.RemoteProtocolError, httpx.RemoteProtocolError),
+    (httpcore.LocalProtocolError, httpx.LocalProtocolError),
+    (httpcore.ProtocolError, httpx.ProtocolError),
+]
+
+@contextmanager
+def _map_exceptions() -> Iterator[None]:
+    """把 httpcore 的异常转换为 httpx 的异常，调用方只需处理 httpx.HTTPError"""
+    try:
+        yield
+    except Exception as e:
+        for source, target in _EXCEPTIONS:
+            if isinstance(e, source):
+                raise target(str(e)) from e
+        raise
+
+class _ResponseStream(AsyncByteStream):
+    def __init__(self, stream):
+        self._stream = stream
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        with _map_exceptions():
+            async for chunk in self._stream:
+                yield chunk
+
+    async def aclose(self) -> None:
+        if hasattr(self._stream, 'aclose'):
+            await self._stream.aclose()
+
+class _PoolTransport(AsyncBaseTransport):
+    """把 httpx 请求交给 httpcore 连接池处理，连接池由调用方按需构造（网络后端、代理等）"""
+
+    def __init__(self, pool: httpcore.AsyncConnectionPool):
+        self.pool = pool
+
+    async def handle_async_request(self, request: Request) -> Response:
+        core_request = httpcore.Request(
+            method=request.method,
+            url=httpcore.URL(scheme=request.url.raw_scheme, host=request.url.raw_host, port=request.url.port, target=request.url.raw_path),
+            headers=request.headers.raw,
+            content=request.stream,
+            extensions=request.extensions
+        )
+        with _map_exceptions():
+            response = await self.pool.handle_async_request(core_request)
+        return Response(status_code=response.status, headers=response.headers, stream=_ResponseStream(response.stream), extensions=response.extensions)
+
+    async def aclose(self) -> None:
+        await self.pool.aclose()
+
+class SharedTransport(AsyncBaseTransport):
+    """由所有适配器和下载器共用的传输层：每个主机一个连接池，共享 DNS 缓存和已建立的 TLS 连接
+
+    每个使用者通过 acquire() 登记，客户端关闭时调用 aclose() 注销；最后一个使用者注销时才真正关闭连接池。
+    HTTP/2 会把同一主机的并发请求复用到一条连接上，按字节范围或分片并发下载时应通过 http1() 只使用 HTTP/1.1 连接池。
+    """
+
+    def __init__(self, config: Optional[TransportConfig] = None, ssl_context: Optional[ssl.SSLContext] = None):
+        self.config = config if config is not None else TransportConfig()
+        self.ssl_context = ssl_context if ssl_context is not None else create_ssl_context()
+        self.dns_cache = DNSCache(self.config.dns_ttl)
+        self._pools: Dict[Tuple[bytes, bytes, Optional[int], bool], _PoolTransport] = {}
+        self._users = 0
+        # 协议（http、https、all、no）-> 代理，创建时读取一次环境变量
+        if self.config.proxy is not None:
+            self._proxies = {'all': self.config.proxy}
+        elif self.config.trust_env:
+            self._proxies = urllib.request.getproxies()
+        else:
+            self._proxies = {}
+
+    def acquire(self) -> 'SharedTransport':
+        self._users += 1
+        return self
+
+    def http1(self) -> '_HTTP1Transport':
+        """返回只使用 HTTP/1.1 连接池的视图，与本传输层共用连接池、DNS 缓存和使用者计数"""
+        return _HTTP1Transport(self)
+
+    def proxy_for(self, url: URL) -> Optional[URL]:
+        """返回访问 url 时使用的代理，NO_PROXY 命中或未配置代理时返回 None"""
+        if self.config.proxy is None and urllib.request.proxy_bypass_environment(url.host, self._proxies):
+            return None
+        proxy = self._proxies.get(url.scheme) or self._proxies.get('all')
+        return URL(proxy) if proxy else None
+
+    def _pool(self, url: URL, http2: bool = True) -> _PoolTransport:
+        # 明文 HTTP 不会协商 HTTP/2，不必为其区分连接池
+        http2 = http2 and self.config.http2 and HTTP2_AVAILABLE and url.scheme == 'https'
+        key = (url.raw_scheme, url.raw_host, url.port, http2)
+        pool = self._pools.get(key)
+        if pool is None:
+            max_connections = self.config.host_limits.get(url.host, self.config.max_connections_per_host)
+            options = dict(
+                ssl_context=self.ssl_context,
+                max_connections=max_connections,
+                max_keepalive_connections=min(max_connections, self.config.max_keepalive_per_host),
+                keepalive_expiry=self.config.keepalive_expiry,
+                http1=True,
+                http2=http2,
+                retries=self.config.retries,
+                network_backend=CachingNetworkBackend(httpcore.AnyIOBackend(), self.dns_cache)
+            )
+            proxy = self.proxy_for(url)
+            if proxy is None:
+                connection_pool = httpcore.AsyncConnectionPool(**options)
+            else:
+                connection_pool = self._proxy_pool(proxy, options)
+            pool = self._pools[key] = _PoolTransport(connection_pool)
+        return pool
+
+    def _proxy_pool(self, proxy: URL, options: dict) -> httpcore.AsyncConnectionPool:
+        proxy_url = httpcore.URL(scheme=proxy.raw_scheme, host=proxy.raw_host, port=proxy.port, target=proxy.raw_path)
+        proxy_auth = (proxy.username, proxy.password) if proxy.username or proxy.password else None
+        if proxy.scheme in ('http', 'https'):
+            return httpcore.AsyncHTTPProxy(proxy_url=proxy_url, proxy_auth=proxy_auth, **options)
+        if proxy.scheme in ('socks5', 'socks5h'):
+            if not SOCKS_AVAILABLE:
+                raise ImportError(f"Proxy {proxy.host} uses SOCKS, but the 'socksio' package is not installed")
+            return httpcore.AsyncSOCKSProxy(proxy_url=proxy_url, proxy_auth=proxy_auth, **options)
+        raise ValueError(f"Unsupported proxy scheme: {proxy.scheme}")
+
+    async def handle_async_request(self, request: Request) -> Response:
+        return await self._pool(request.url, request.extensions.get(HTTP2_EXTENSION, True)).handle_async_request(request)
+
+    async def aclose(self) -> None:
+        self._users = max(0, self._users - 1)
+        if self._users == 0:
+            await self.close_pools()
+
+    async def close_pools(self) -> None:
+        """立即关闭所有连接池，之后的请求会重新建立连接"""
+        pools = list(self._pools.values())
+        self._pools.clear()
+        for pool in pools:
+            await pool.aclose()
+
+class _HTTP1Transport(AsyncBaseTransport):
+    """SharedTransport 的 HTTP/1.1 视图：给请求打上标记后交给原传输层，关闭时注销原传输层的使用者"""
+
+    def __init__(self, shared: SharedTransport):
+        self.shared = shared
+
+    async def handle_async_request(self, request: Request) -> Response:
+        request.extensions[HTTP2_EXTENSION] = False
+        return await self.shared.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        await self.shared.aclose()
+
+_default_transport: Optional[SharedTransport] = None
+
+def default_transport() -> SharedTransport:
+    """进程内默认的共享传输层"""
+    global _default_transport
+    if _default_transport is None:
+        _default_transport = SharedTransport()
+    return _default_transport
+
+def create_client(transport: Optional[AsyncBaseTransport] = None, http2: bool = True, **kwargs) -> AsyncClient:
+    """创建使用共享传输层的 AsyncClient，transport 为空时使用默认的共享传输层；http2 为 False 时只使用 HTTP/1.1 连接"""
+    transport = transport if transport is not None else default_transport()
+    if isinstance(transport, SharedTransport):
+        transport.acquire()
+        if not http2:
+            transport = transport.http1()
+    return AsyncClient(transport=transport, **kwargs)
@@ -0,0 +1,260 @@
+from AniDL.adapters import AdapterNotFound, find_adapter_name
+from typing import List, Dict, Any, Optional, Set, TextIO, Callable, Awaitable, Iterator, TYPE_CHECKING
+from contextlib import contextmanager
+from pathlib import Path
+import argparse
+import json
+import time
+import sys
+import re
+
+if TYPE_CHECKING:
+    from AniDL.adapters.adapter import Adapter
+    from AniDL.Models import Season, Episode, VideoMedia, AudioMedia
+    from AniDL.Metrics import Metrics
+    from httpx import Cookies
+    import asyncio
+
+# 批量下载：python -m AniDL urls.txt，或从标准输入读取播放链接
+# 流水线分三个阶段：解析播放链接 -> 解析剧集流 -> 下载，阶段之间用有界队列连接，
+# 解析后面剧集的同时下载前面的剧集；队列满时上游暂停，避免解析结果堆积到过期
+# 模块顶层只导入标准库和适配器注册表，httpx、pydantic 等在 parse_args() 之后才导入，--help 和参数错误可以立即返回
+
+class StageTimer:
+    """记录流水线每个阶段每次处理的耗时"""
+
+    def __init__(self, metrics: Optional['Metrics'] = None):
+        self.metrics = metrics # 同时把耗时记录到 pipeline_stage_seconds 直方图
+        self.durations: Dict[str, List[float]] = {}
+        self.spans: Dict[str, List[float]] = {} # 阶段 -> [第一次开始, 最后一次结束]
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def measure(self, stage: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.durations.setdefault(stage, []).append(end - start)
+            span = self.spans.setdefault(stage, [start, end])
+            span[0], span[1] = min(span[0], start), max(span[1], end)
+            if self.metrics is not None:
+                self.metrics.observe('pipeline_stage_seconds', end - start, stage=stage)
+
+    def report(self) -> str:
+        lines = [f"{'阶段':<10}{'次数':>6}{'总耗时':>10}{'平均':>10}{'p50':>10}{'最大':>10}{'起止':>18}"]
+        busy = 0.0
+        for stage, durations in self.durations.items():
+            ordered = sorted(durations)
+            total = sum(ordered)
+            busy += total
+            first, last = (value - self.started for value in self.spans[stage])
+            lines.append(
+                f"{stage:<12}{len(ordered):>6}{total:>11.2f}s{total / len(ordered):>9.3f}s"
+                f"{ordered[len(ordered) // 2]:>9.3f}s{ordered[-1]:>9.3f}s{first:>9.2f}s-{last:.2f}s"
+            )
+        wall = time.perf_counter() - self.started
+        lines.append(f"总耗时 {wall:.2f}s，各阶段耗时之和 {busy:.2f}s")
+        return '\n'.join(lines)
+
+def parse_episode_numbers(spec: Optional[str]) -> Optional[Set[int]]:
+    """解析集数范围，如 1,3-5；为空时表示全部"""
+    if not spec:
+        return None
+    numbers = set()
+    for part in spec.split(','):
+        start, _, end = part.strip().partition('-')
+        numbers.update(range(int(start), int(end or start) + 1))
+    return numbers
+
+def load_cookies(path: Optional[str]) -> Optional['Cookies']:
+    """读取浏览器导出的 cookies（包含 name、value、domain 的 JSON 列表）"""
+    if path is None:
+        return None
+    from httpx import Cookies
+    cookies = Cookies()
+    for cookie in json.loads(Path(path).read_text(encoding='utf-8')):
+        cookies.set(name=cookie['name'], value=cookie['value'], domain=cookie.get('domain', ''))
+    return cookies
+
+def choose_media(video_medias: List['VideoMedia'], quality: Optional[str]) -> Optional['VideoMedia']:
+    """选择指定画质的视频，未指定或不存在时选择分辨率和码率最高的"""
+    if quality is not None:
+        for media in video_medias:
+            if media.quality == quality:
+                return media
+    return max(video_medias, key=lambda media: (media.height, media.biterate or 0), default=None)
+
+def choose_audio(audio_medias: Optional[List['AudioMedia']]) -> Optional['AudioMedia']:
+    """选择码率最高的音频"""
+    return max(audio_medias or [], key=lambda media: media.biterate or 0, default=None)
+
+def output_path(output_dir: str, template: str, season: 'Season', episode: 'Episode', media: 'VideoMedia') -> Path:
+    # 去掉文件名中不允许的字符
+    season_title = re.sub(r'[\\/:*?"<>|]', '_', season.season_title)
+    name = template.format(season_title=season_title, episode_number=episode.episode_number, episode_id=episode.episode_id, quality=media.quality)
+    return Path(output_dir) / name
+
+async def read_urls(source: TextIO, outbox: 'asyncio.Queue', workers: int) -> None:
+    """逐行读取播放链接，忽略空行和 # 开头的注释；标准输入可以边写边读"""
+    import asyncio
+    try:
+        while line := await asyncio.to_thread(source.readline):
+            url = line.strip()
+            if url and not url.startswith('#'):
+                await outbox.put(url)
+    finally:
+        for _ in range(workers):
+            await outbox.put(None)
+
+async def run_stage(stage: str, handler: Callable[[Any], Awaitable[List[Any]]], inbox: 'asyncio.Queue', outbox: Optional['asyncio.Queue'], workers: int, downstream: int, timer: StageTimer, failures: List[str]) -> None:
+    """运行一个流水线阶段：workers 个协程从 inbox 取任务，结果放入 outbox；上游结束后向下游发送结束标记"""
+    import asyncio
+
+    async def worker():
+        while (item := await inbox.get()) is not None:
+            try:
+                with timer.measure(stage):
+                    results = await handler(item)
+            except Exception as e:
+                failures.append(f"{stage} {item}: {e!r}")
+                print(f"[{stage}] 失败：{item}：{e}", file=sys.stderr)
+                continue
+            if outbox is not None:
+                for result in results:
+                    # 下游繁忙时在此等待（背压）
+                    await outbox.put(result)
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(workers)))
+    finally:
+        if outbox is not None:
+            for _ in range(downstream):
+                await outbox.put(None)
+
+class Pipeline:
+    """解析与下载的流水线"""
+
+    def __init__(self, args: argparse.Namespace):
+        from AniDL.Metrics import metrics
+        from AniDL.utils import Downloader
+        self.args = args
+        self.cookies = load_cookies(args.cookies)
+        self.episode_numbers = parse_episode_numbers(args.episodes)
+        self.adapters: Dict[str, 'Adapter'] = {}
+        self.downloader = Downloader(concurrency=args.concurrency)
+        self.timer = StageTimer(metrics)
+        self.failures: List[str] = []
+
+    def get_adapter(self, url: str) -> 'Adapter':
+        adapter_name = find_adapter_name(url)
+        adapter = self.adapters.get(adapter_name)
+        if adapter is None:
+            from AniDL.adapters.adapter import Adapter
+            adapter = self.adapters[adapter_name] = Adapter(adapter_name, cookies=self.cookies)
+        return adapter
+
+    async def resolve_playurl(self, url: str) -> List[tuple]:
+        from AniDL.Models import InstanceAlreadyExistsError
+        try:
+            adapter = self.get_adapter(url)
+        except AdapterNotFound:
+            raise ValueError("没有匹配的适配器")
+        try:
+            season, episodes = await adapter.parse_playurl(url)
+        except InstanceAlreadyExistsError:
+            # 同一季的多个链接只处理一次
+            print(f"[playurl] 已在处理同一季，跳过：{url}", file=sys.stderr)
+            return []
+        episodes = sorted(episodes, key=lambda episode: episode.episode_number)
+        if self.episode_numbers is not None:
+            episodes = [episode for episode in episodes if episode.episode_number in self.episode_numbers]
+        return [(adapter, season, episode) for episode in episodes]
+
+    async def resolve_stream(self, item: tuple) -> List[tuple]:
+        from AniDL.Models import FileType
+        adapter, season, episode = item
+        video_medias, audio_medias, _ = await adapter.parse_stream(episode)
+        media = choose_media(video_medias, self.args.quality)
+        if media is None:
+            raise ValueError(f"剧集 {episode.episode_id} 没有可用的视频流")
+        # DASH 的视频和音频是分开的 Representation，需要一起下载
+        audio = choose_audio(audio_medias) if media.file_type == FileType.MPD else None
+        return [(season, episode, media, audio)]
+
+    async def download(self, item: tuple) -> List[tuple]:
+        season, episode, media, audio = item
+        output = output_path(self.args.output_dir, self.args.template, season, episode, media)
+        jobs = [(media, output)]
+        if audio is not None:
+            jobs.append((audio, output.with_name(output.stem + '.audio.m4a')))
+        if self.args.dry_run:
+            # 只获取媒体播放列表，不下载分片
+            for job_media, job_output in jobs:
+                segments = [segment async for segment in self.downloader.iter_media_segments(job_media)]
+                print(f"{job_output}（{media.quality}，{len(segments)} 个分片）")
+            return []
+        output.parent.mkdir(parents=True, exist_ok=True)
+        started = time.perf_counter()
+        try:
+            await self.downloader.download_all(jobs)
+        finally:
+            for _, job_output in jobs:
+                self.downloader.metrics.remove_task(str(job_output))
+        size = sum(job_output.stat().st_size for _, job_output in jobs)
+        print(f"{output}（{media.quality}，{size / 1024 / 1024:.1f} MB，{time.perf_counter() - started:.1f}s）")
+        return []
+
+    async def run(self, source: TextIO) -> int:
+        args = self.args
+        import asyncio
+        urls = asyncio.Queue(args.queue_size)
+        episodes = asyncio.Queue(args.queue_size)
+        medias = asyncio.Queue(args.queue_size)
+        try:
+            await asyncio.gather(
+                read_urls(source, urls, 1),
+                run_stage('playurl', self.resolve_playurl, urls, episodes, 1, args.resolve_workers, self.timer, self.failures),
+                run_stage('stream', self.resolve_stream, episodes, medias, args.resolve_workers, args.jobs, self.timer, self.failures),
+                run_stage('download', self.download, medias, None, args.jobs, 0, self.timer, self.failures),
+            )
+        finally:
+            for adapter in self.adapters.values():
+                await adapter.close()
+            await self.downloader.close()
+        if args.dry_run or args.timings:
+            print(self.timer.report(), file=sys.stderr)
+        return 1 if self.failures else 0
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='python -m AniDL', description='批量解析并下载播放链接中的剧集')
+    parser.add_argument('input', nargs='?', default='-', help='每行一个播放链接的文件，- 表示标准输入（默认）')
+    parser.add_argument('-o', '--output-dir', default='.', help='输出目录')
+    parser.add_argument('--template', default='{season_title}/{episode_number:02d}.ts', help='输出文件名模板，可用 season_title、episode_number、episode_id、quality')
+    parser.add_argument('-e', '--episodes', help='只下载这些集，如 1,3-5')
+    parser.add_argument('-q', '--quality', help='画质，如 1080P；不存在时选择最高画质')
+    parser.add_argument('--cookies', help='浏览器导出的 cookies JSON 文件')
+    parser.add_argument('-j', '--jobs', type=int, default=2, help='同时下载的剧集数')
+    parser.add_argument('--resolve-workers', type=int, default=4, help='同时解析剧集流的协程数')
+    parser.add_argument('--queue-size', type=int, default=8, help='阶段之间队列的容量')
+    parser.add_argument('--concurrency', type=int, default=8, help='每个剧集同时下载的分片数')
+    parser.add_argument('--limit-rate', type=float, help='总带宽上限，单位：MB/s')
+    parser.add_argument('-n', '--dry-run', action='store_true', help='只解析并获取媒体播放列表，不下载，最后输出各阶段耗时')
+    parser.add_argument('--timings', action='store_true', help='结束时输出各阶段耗时')
+    return parser
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    from AniDL.utils import bandwidth_limiter
+    import asyncio
+    if args.limit_rate:
+        bandwidth_limiter.set_rate(args.limit_rate * 1024 * 1024)
+    pipeline = Pipeline(args)
+    if args.input == '-':
+        return asyncio.run(pipeline.run(sys.stdin))
+    with open(args.input, encoding='utf-8') as source:
+        return asyncio.run(pipeline.run(source))
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,55 @@
+from AniDL.Models import Season, Episode, VideoMedia, AudioMedia, SubtitleMedia
+from AniDL.adapters.registry import load_adapter, find_adapter_name
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator, Type
+from AniDL.Interfaces import BaseAdapterInterface
+from AniDL.Cache import BaseCache
+from AniDL.Metrics import Metrics
+from datetime import datetime
+from httpx import Cookies, AsyncBaseTransport
+
+class Adapter(BaseAdapterInterface):
+    """通用适配器，自动匹配对应的适配器，适配器在被选中时才导入"""
+
+    def get_adapter(self, adapter_name: str) -> Type[BaseAdapterInterface]:
+        return load_adapter(adapter_name)
+            
+    def choose_adapter(self, url: str) -> Type[BaseAdapterInterface]:
+        return load_adapter(find_adapter_name(url))
+
+    def __init__(self, feature: str, cookies: Cookies = None, cache: Optional[BaseCache] = None, metrics: Optional[Metrics] = None, transport: Optional[AsyncBaseTransport] = None):
+        # 判断feature是否为url
+        if feature.startswith("http"):
+            adapter = self.choose_adapter(feature)
+        else:
+            adapter = self.get_adapter(feature)
+        self.adapter = adapter(cookies, cache, metrics, transport)
+        self.metrics = self.adapter.metrics
+
+    @property
+    def stream_ttl(self) -> float:
+        return self.adapter.stream_ttl
+    
+    def set_cookies(self, cookies: Cookies) -> None:
+        self.adapter.set_cookies(cookies)
+
+    async def close(self) -> None:
+        await self.adapter.close()
+
+    async def login(self, username: str, password: str, set_cookies: bool = True) -> Cookies:
+        return await self.adapter.login(username, password, set_cookies)
+    
+    async def username(self) -> str | None:
+        return await self.adapter.username()
+    
+    async def subscription_due_date(self) -> datetime | None:
+        return await self.adapter.subscription_due_date()
+    
+    async def parse_playurl(self, playurl: str) -> Tuple[Season, List[Episode]]:
+        return await self.adapter.parse_playurl(playurl)
+    
+    async def parse_stream(self, episode: Episode, refresh: bool = False) -> Tuple[List[VideoMedia], Optional[List[AudioMedia]], Optional[List[SubtitleMedia]]]:
+        return await self.adapter.parse_stream(episode, refresh)
+
+    async def parse_season_streams(self, episodes: List[Episode], concurrency: int = 4) -> AsyncIterator[Tuple[Episode, Tuple[List[VideoMedia], Optional[List[AudioMedia]], Optional[List[SubtitleMedia]]]]]:
+        async for result in self.adapter.parse_season_streams(episodes, concurrency):
+            yield result
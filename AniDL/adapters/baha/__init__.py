@@ -1,8 +1,13 @@
 from AniDL.Models import Season, Episode, VideoMedia, AudioMedia, SubtitleMedia, UrlType, DRMType, FileType
-from AniDL.Interfaces import BaseAdapterInterface, SeasonNotExistsError
+from AniDL.Interfaces import BaseAdapterInterface, SeasonNotExistsError, RetryExhaustedError, StreamNotAvailableError
+from AniDL.Cache import BaseCache, SQLiteCache, MemoryCache
+from AniDL.Metrics import Metrics
+from AniDL.Transport import create_client
+from AniDL.utils import RateLimiter, backoff_delay
 from typing import List, Dict, Any, Optional, Tuple
-from httpx import Cookies, AsyncClient
+from httpx import Cookies, AsyncBaseTransport, Request, Response, TransportError
 from datetime import datetime
+import asyncio
 import m3u8
 import re
 
@@ -25,6 +30,7 @@ headers = {
 class BahaAPI:
     season_episode_info = "https://api.gamer.com.tw/anime/v1/video.php?videoSn={sn}"
     master_m3u8 = "https://ani.gamer.com.tw/ajax/m3u8.php?sn={sn}&device={device_id}"
+    device_id = "https://ani.gamer.com.tw/ajax/getdeviceid.php"
 
 class BahaAdapter(BaseAdapterInterface):
     """巴哈姆特动画疯适配器"""
@@ -32,14 +38,67 @@ class BahaAdapter(BaseAdapterInterface):
         adapter_name = "baha"
         base_play_url = ["https://ani.gamer.com.tw/animeRef.php?sn=", "https://ani.gamer.com.tw/animeVideo.php?sn="]
         custom_login = False
+        season_ttl = 24 * 60 * 60 # 季信息缓存时间，单位：秒
+        stream_ttl = 10 * 60 # 带签名的 m3u8 地址缓存时间，单位：秒
+        rate_limit = 5 # 每秒最多发出的请求数
+        rate_burst = 5 # 允许的突发请求数
+        max_retries = 5 # 单个请求的最大重试次数
+        retry_base_delay = 0.5 # 重试退避的基础间隔，单位：秒
+        retry_max_delay = 30 # 重试退避的最大间隔，单位：秒
+        retry_status_codes = {429, 500, 502, 503, 504}
 
-    def __init__(self, cookies: Cookies = None):
+    def __init__(self, cookies: Cookies = None, cache: Optional[BaseCache] = None, metrics: Optional[Metrics] = None, transport: Optional[AsyncBaseTransport] = None):
         self.set_cookies(cookies)
-        self.client = AsyncClient(headers=headers, cookies=cookies)
+        if metrics is not None:
+            self.metrics = metrics
+        self.rate_limiter = RateLimiter(self.Config.rate_limit, self.Config.rate_burst)
+        # 所有经由 client 的请求（包括重定向）都要先通过限速器
+        self.client = create_client(transport, headers=headers, cookies=cookies, event_hooks={'request': [self._throttle], 'response': [self._record_response]})
+        self._owns_cache = cache is None # 只关闭自己创建的缓存
+        self.cache = cache if cache is not None else SQLiteCache()
         self.device_id = None # 缓存设备ID
+        self._device_id_lock = asyncio.Lock() # 并发解析时只获取一次设备ID
 
     def set_cookies(self, cookies: Cookies) -> None:
         self.cookies = cookies
+        # 签名地址绑定设备ID和登录会话，只缓存在本适配器实例中，不写入可被其他进程、账号读到的持久缓存；
+        # 更换 cookies 即更换会话，旧的签名地址一并丢弃
+        self.stream_cache = MemoryCache()
+
+    async def close(self) -> None:
+        await self.client.aclose()
+        if self._owns_cache:
+            self.cache.close()
+
+    async def _throttle(self, request: Request) -> None:
+        await self.rate_limiter.acquire()
+
+    async def _record_response(self, response: Response) -> None:
+        """按接口统计响应状态码，CDN 上的路径带有剧集编号，只按主机名统计"""
+        url = response.request.url
+        endpoint = f"{url.host}{url.path}" if url.path.endswith('.php') else url.host
+        self.metrics.inc('http_responses_total', endpoint=endpoint, status=response.status_code)
+
+    def _record_retry(self, reason: str) -> None:
+        self.metrics.inc('retries_total', component=self.Config.adapter_name, reason=reason)
+        self.metrics.emit('retry', component=self.Config.adapter_name, reason=reason)
+
+    async def _get(self, url: str, **kwargs) -> Response:
+        """带重试的 GET 请求，网络错误或限流、服务端错误时按指数退避重试"""
+        for attempt in range(self.Config.max_retries + 1):
+            try:
+                response = await self.client.get(url, **kwargs)
+            except TransportError as e:
+                reason, kind = repr(e), type(e).__name__
+            else:
+                if response.status_code not in self.Config.retry_status_codes:
+                    return response
+                reason = kind = f"HTTP {response.status_code}"
+            if attempt == self.Config.max_retries:
+                break
+            self._record_retry(kind)
+            await asyncio.sleep(backoff_delay(attempt, self.Config.retry_base_delay, self.Config.retry_max_delay))
+        raise RetryExhaustedError(url, self.Config.max_retries, reason)
 
     async def login(self, username: str, password: str, set_cookies: bool = True) -> Cookies:
         pass
@@ -47,7 +106,7 @@ class BahaAdapter(BaseAdapterInterface):
     async def username(self) -> str | None:
         if not self.cookies:
             return None
-        response = await self.client.get('https://home.gamer.com.tw/profile/index.php', follow_redirects=False)
+        response = await self._get('https://home.gamer.com.tw/profile/index.php', follow_redirects=False)
         # 该请求一定是302重定向，获得重定向地址
         redirect_url = response.headers['Location']
         # 如果登录成功，则定向到https://home.gamer.com.tw/profile/index.php?owner={username}，否则为https://home.gamer.com.tw
@@ -58,72 +117,129 @@ class BahaAdapter(BaseAdapterInterface):
             return username
         
     async def subscription_due_date(self) -> datetime | None:
-        response = await self.client.get('https://ani.gamer.com.tw/animePayed.php', follow_redirects=False)
+        response = await self._get('https://ani.gamer.com.tw/animePayed.php', follow_redirects=False)
         pattern = re.compile(r"最終服務到期日為 <b>(.+?)</b>")
         result = pattern.search(response.text)
         result = result.group(1) if result else None # 比如2024-10-15 22:51
         return datetime.strptime(result, "%Y-%m-%d %H:%M") if result else None
     
     async def parse_playurl(self, playurl: str) -> Tuple[Season, List[Episode]]:
+        namespace = self.Config.adapter_name
         if playurl.startswith(self.Config.base_play_url[0]):
             # https://ani.gamer.com.tw/animeRef.php?sn=112458
-            response = await self.client.get(playurl, follow_redirects=False)
-            if response.status_code == 301 or response.status_code == 302:
-                playurl = response.headers.get('Location')
-            else:
-                raise SeasonNotExistsError(playurl)
+            ref_sn = re.search(r"sn=(\d+)", playurl).group(1)
+            ref_key = f"ref:{ref_sn}"
+            location = self.cache.get(namespace, ref_key)
+            if location is None:
+                response = await self._get(playurl, follow_redirects=False)
+                if response.status_code == 301 or response.status_code == 302:
+                    location = response.headers.get('Location')
+                    self.cache.set(namespace, ref_key, location, self.Config.season_ttl)
+                else:
+                    raise SeasonNotExistsError(playurl)
+            playurl = location
         sn = re.search(r"sn=(\d+)", playurl).group(1)
-        url = BahaAPI.season_episode_info.format(sn=sn)
-        response = await self.client.get(url)
-        data = response.json()
-        anime = data['data']['anime']
+        anime = self.cache.get(namespace, f"video:{sn}")
+        if anime is None:
+            url = BahaAPI.season_episode_info.format(sn=sn)
+            response = await self._get(url)
+            data = response.json()
+            anime = data['data']['anime']
+            self.cache.set(namespace, f"video:{sn}", anime, self.Config.season_ttl)
         season_id = anime['animeSn']
         season_title = anime['title']
         season_title = re.sub(r"\[\d+\]", "", season_title).strip() # 对标题要用正则删除[2]这种标记
         season = Season(season_id=season_id, season_title=season_title, namespace=self.Config.adapter_name)
-        episodes = []
         raw_episodes = list(anime['episodes'].values())[0]
-        for raw_episode in raw_episodes:
-            episodes.append(
-                Episode(
-                    episode_id=raw_episode['videoSn'], 
-                    episode_title='', 
-                    season_id=season_id, 
-                    episode_number=raw_episode['episode'], 
-                    namespace=self.Config.adapter_name
-                )
-            )
+        # 字段类型已确定，批量构造以跳过逐个校验
+        episodes = Episode.construct_many(
+            [
+                {
+                    'episode_id': int(raw_episode['videoSn']),
+                    'episode_title': '',
+                    'season_id': int(season_id),
+                    'episode_number': int(raw_episode['episode']),
+                }
+                for raw_episode in raw_episodes
+            ],
+            namespace=self.Config.adapter_name
+        )
         return season, episodes
 
-    async def parse_stream(self, episode: Episode) -> Tuple[List[VideoMedia], Optional[List[AudioMedia]], Optional[List[SubtitleMedia]]]:
-        """解析剧集流，返回视频、音频、字幕流"""
-        self.device_id = (await self.client.get('https://ani.gamer.com.tw/ajax/getdeviceid.php')).json()['deviceid'] if self.device_id is None else self.device_id
-        url = BahaAPI.master_m3u8.format(sn=episode.episode_id, device_id=self.device_id)
-        response = await self.client.get(url)
-        data = response.json()
-        if 'src' not in data:
-            print(data)
-            self.device_id = None
-            return await self.parse_stream(episode)
-        m3u8_url = data['src']
+    async def get_device_id(self) -> str:
+        """获取设备ID，已缓存时直接返回，并发调用共享同一次请求"""
+        async with self._device_id_lock:
+            if self.device_id is None:
+                self.device_id = (await self._get(BahaAPI.device_id)).json()['deviceid']
+            return self.device_id
+
+    async def _get_m3u8_url(self, episode: Episode) -> str:
+        """获取带签名的主播放列表地址，未返回地址时更换设备ID并退避重试"""
+        for attempt in range(self.Config.max_retries + 1):
+            device_id = await self.get_device_id()
+            url = BahaAPI.master_m3u8.format(sn=episode.episode_id, device_id=device_id)
+            data = (await self._get(url)).json()
+            if 'src' in data:
+                return data['src']
+            # 其他协程可能已经换过设备ID，只重置自己用过的
+            if self.device_id == device_id:
+                self.device_id = None
+            if attempt == self.Config.max_retries:
+                break
+            self._record_retry('no src')
+            await asyncio.sleep(backoff_delay(attempt, self.Config.retry_base_delay, self.Config.retry_max_delay))
+        raise StreamNotAvailableError(episode.episode_id, self.Config.max_retries, data)
+
+    async def parse_stream(self, episode: Episode, refresh: bool = False) -> Tuple[List[VideoMedia], Optional[List[AudioMedia]], Optional[List[SubtitleMedia]]]:
+        """解析剧集流，返回视频、音频、字幕流；refresh 为 True 时丢弃缓存的签名地址，重新获取"""
+        stream_key = f"stream:{episode.episode_id}"
+        if refresh:
+            self.stream_cache.delete(self.Config.adapter_name, stream_key)
+        cached = self.stream_cache.get(self.Config.adapter_name, stream_key)
+        if cached is not None:
+            m3u8_url, master_m3u8 = cached
+        else:
+            m3u8_url = await self._get_m3u8_url(episode)
+            response = await self._get(m3u8_url)
+            master_m3u8 = response.text
+            self.stream_cache.set(self.Config.adapter_name, stream_key, [m3u8_url, master_m3u8], self.Config.stream_ttl)
         base_url = m3u8_url.split('playlist_advance.m3u8')[0]
-        response = await self.client.get(m3u8_url)
-        master_m3u8 = response.text
         master_playlist = m3u8.loads(master_m3u8, uri=base_url)
+        video_medias = self._register_videos(
+            episode,
+            [
+                {
+                    'episode_id': episode.episode_id,
+                    'url': base_url + playlist.uri,
+                    'url_type': UrlType.HTTPS,
+                    'file_type': FileType.M3U8,
+                    'headers': {'Origin': 'https://ani.gamer.com.tw'},
+                    'biterate': playlist.stream_info.bandwidth,
+                    'drm_type': DRMType.HLS,
+                    'width': playlist.stream_info.resolution[0],
+                    'height': playlist.stream_info.resolution[1],
+                }
+                for playlist in master_playlist.playlists
+            ]
+        )
+        return video_medias, None, None
+
+    def _register_videos(self, episode: Episode, records: List[Dict[str, Any]]) -> List[VideoMedia]:
+        """登记视频流；同一规格的实例仍存活时（如调度器持有的旧地址）原地换上新地址，而不是重复登记"""
+        namespace = self.Config.adapter_name
+        existing = {(media.quality, media.codec): media for media in VideoMedia.find(namespace=namespace, episode_id=episode.episode_id)}
+        records = [VideoMedia._prepare_data(record) for record in records]
+        created = iter(VideoMedia.construct_many(
+            [record for record in records if (record['quality'], record.get('codec')) not in existing],
+            namespace=namespace
+        ))
         video_medias = []
-        for playlist in master_playlist.playlists:
-            video_medias.append(
-                VideoMedia(
-                    episode_id=episode.episode_id,
-                    url=base_url + playlist.uri,
-                    url_type=UrlType.HTTPS,
-                    file_type=FileType.M3U8,
-                    headers={'Origin': 'https://ani.gamer.com.tw'},
-                    biterate=playlist.stream_info.bandwidth,
-                    drm_type=DRMType.HLS,
-                    width=playlist.stream_info.resolution[0],
-                    height=playlist.stream_info.resolution[1],
-                    namespace=self.Config.adapter_name
-                )
-            )
-        return video_medias, None, None
\ No newline at end of file
+        for record in records:
+            media = existing.get((record['quality'], record.get('codec')))
+            if media is None:
+                video_medias.append(next(created))
+                continue
+            for name, value in record.items():
+                setattr(media, name, value)
+            video_medias.append(media)
+        return video_medias
\ No newline at end of file
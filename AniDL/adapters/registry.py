@@ -0,0 +1,88 @@
+# 适配器注册表，只依赖标准库，按名称或链接分发时不会导入适配器本身
+from typing import List, Dict, Tuple, NamedTuple, Type, TYPE_CHECKING
+from importlib import import_module
+
+if TYPE_CHECKING:
+    from AniDL.Interfaces import BaseAdapterInterface
+
+# 定义未找到适配器异常
+class AdapterNotFound(Exception):
+    def __init__(self, adapter_name: str):
+        self.adapter_name = adapter_name
+        self.message = f"Adapter {adapter_name} not found"
+        super().__init__(self.message)
+
+class AdapterConfigMismatch(Exception):
+    """当注册的链接前缀与适配器 Config.base_play_url 不一致时引发的异常"""
+    def __init__(self, adapter_name: str, registered: List[str], declared: List[str]):
+        self.adapter_name = adapter_name
+        self.message = f"Adapter {adapter_name} registered with {registered}, but Config.base_play_url is {declared}"
+        super().__init__(self.message)
+
+class AdapterEntry(NamedTuple):
+    """描述一个已注册但不一定已导入的适配器"""
+    adapter_name: str
+    module: str # 适配器所在模块
+    class_name: str
+    base_play_url: List[str] # 需与适配器 Config.base_play_url 保持一致
+
+_entries: Dict[str, AdapterEntry] = {}
+_loaded: Dict[str, Type['BaseAdapterInterface']] = {}
+# 主机名 -> [(去掉协议和主机名后的链接前缀, 适配器名)]，前缀按长度从长到短排列
+_prefix_index: Dict[str, List[Tuple[str, str]]] = {}
+
+def _split_url(url: str) -> Tuple[str, str]:
+    """把链接拆分为 (小写主机名, 其余部分)，忽略协议"""
+    rest = url.split('://', 1)[-1]
+    host, sep, path = rest.partition('/')
+    return host.lower(), sep + path
+
+def register_adapter(adapter_name: str, module: str, class_name: str, base_play_url: List[str]) -> None:
+    """注册适配器，导入推迟到首次使用时；同名适配器重新注册时替换其原有的链接前缀"""
+    old_entry = _entries.get(adapter_name)
+    if old_entry is not None:
+        for base_url in old_entry.base_play_url:
+            host, _ = _split_url(base_url)
+            prefixes = [item for item in _prefix_index.get(host, []) if item[1] != adapter_name]
+            if prefixes:
+                _prefix_index[host] = prefixes
+            else:
+                _prefix_index.pop(host, None)
+    _entries[adapter_name] = AdapterEntry(adapter_name, module, class_name, base_play_url)
+    _loaded.pop(adapter_name, None)
+    for base_url in base_play_url:
+        host, path = _split_url(base_url)
+        prefixes = _prefix_index.setdefault(host, [])
+        prefixes.append((path, adapter_name))
+        prefixes.sort(key=lambda item: len(item[0]), reverse=True)
+
+def adapter_names() -> List[str]:
+    """返回所有已注册的适配器名称"""
+    return list(_entries)
+
+def find_adapter_name(url: str) -> str:
+    """按链接前缀查找适配器名称，多个前缀匹配时取最长的"""
+    host, path = _split_url(url)
+    for prefix, adapter_name in _prefix_index.get(host, ()):
+        if path.startswith(prefix):
+            return adapter_name
+    raise AdapterNotFound("Unknown")
+
+def load_adapter(adapter_name: str) -> Type['BaseAdapterInterface']:
+    """导入并返回适配器类，首次导入时检查注册的链接前缀与适配器声明的一致"""
+    adapter = _loaded.get(adapter_name)
+    if adapter is None:
+        entry = _entries.get(adapter_name)
+        if entry is None:
+            raise AdapterNotFound(adapter_name)
+        adapter = getattr(import_module(entry.module), entry.class_name)
+        declared = list(getattr(adapter.Config, 'base_play_url', []))
+        if sorted(declared) != sorted(entry.base_play_url):
+            raise AdapterConfigMismatch(adapter_name, list(entry.base_play_url), declared)
+        _loaded[adapter_name] = adapter
+    return adapter
+
+register_adapter(
+    "baha", "AniDL.adapters.baha", "BahaAdapter",
+    ["https://ani.gamer.com.tw/animeRef.php?sn=", "https://ani.gamer.com.tw/animeVideo.php?sn="]
+)
@@ -1,4 +1,811 @@
+from AniDL.Models import Media, FileType
+from AniDL.Metrics import Metrics, TaskProgress, metrics as default_metrics
+from AniDL.Transport import create_client
+from AniDL.Playlist import Segment, SegmentKey, PlaylistParser
+from AniDL.Dash import parse_mpd, iter_segments
+from typing import List, Dict, Any, Optional, Tuple, BinaryIO, Callable, AsyncIterator, Iterable
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.padding import PKCS7
+from httpx import AsyncClient, AsyncBaseTransport, HTTPError, Response
+from contextlib import aclosing
+from pathlib import Path
+import asyncio
+import errno
+import heapq
+import io
+import itertools
+import os
+import random
+import shutil
+import time
 
+# 单个文件直接下载（不经过播放列表）的文件类型
+DIRECT_FILE_TYPES = {FileType.TS, FileType.M4S, FileType.ASS, FileType.SRT}
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 30.0) -> float:
+    """带随机抖动的指数退避间隔（full jitter），attempt 从 0 开始"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+class RateLimiter:
+    """令牌桶限速器，rate 为每秒补充的令牌数，burst 为桶容量；等待者按先后顺序获得令牌"""
+
+    def __init__(self, rate: float, burst: float = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens: float = 1) -> None:
+        """获取令牌，令牌不足时等待；一次可获取多于 burst 的令牌，超出部分记为欠额由后续补充"""
+        async with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            if self._tokens < 0:
+                # 持有锁等待，保证请求速率平稳，不受并发协程数量影响
+                await asyncio.sleep(-self._tokens / self.rate)
+
+class BandwidthLimiter:
+    """全局带宽限制器，在所有下载任务之间按权重公平分配带宽（start-time fair queuing），速率和权重可在运行时调整
+
+    rate 为每秒允许的字节数，为空时不限速；burst 为桶容量，默认为 0.25 秒的流量。
+    数据收到后再扣除令牌，令牌不足时暂停读取，由 TCP 流控把限速传递给服务器。
+    """
+
+    def __init__(self, rate: Optional[float] = None, burst: Optional[float] = None):
+        self.rate: Optional[float] = None
+        self.burst = 0.0
+        self._tokens = 0.0
+        self._updated = time.monotonic()
+        self._weights: Dict[str, float] = {}
+        self._finish: Dict[str, float] = {} # 任务的虚拟完成时间
+        self._vtime = 0.0 # 最近一次放行的请求的虚拟开始时间
+        self._waiters: List[list] = [] # [虚拟开始时间, 序号, 字节数, future] 的小顶堆
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.set_rate(rate, burst)
+
+    def set_rate(self, rate: Optional[float], burst: Optional[float] = None) -> None:
+        """调整总带宽，立即生效；rate 为空时取消限速并放行所有等待者"""
+        self._refill()
+        self.rate = rate
+        self.burst = burst if burst is not None else (rate or 0) / 4
+        self._tokens = min(self._tokens, self.burst)
+        self._reschedule()
+
+    def set_weight(self, job: str, weight: float) -> None:
+        """设置任务的权重，带宽按权重比例分配"""
+        if weight <= 0:
+            raise ValueError(f"权重必须大于 0：{weight}")
+        self._weights[job] = weight
+
+    def remove_job(self, job: str) -> None:
+        self._weights.pop(job, None)
+        self._finish.pop(job, None)
+
+    async def consume(self, job: str, nbytes: int) -> None:
+        """扣除 job 收到的 nbytes 字节；带宽不足时按公平队列的顺序等待"""
+        if self.rate is None or nbytes <= 0:
+            return
+        self._refill()
+        start = max(self._vtime, self._finish.get(job, 0.0))
+        self._finish[job] = start + nbytes / self._weights.get(job, 1.0)
+        if not self._waiters and self._tokens >= 0:
+            # 没有竞争时直接放行，不切换协程；虚拟时间照常推进，之后出现竞争时已放行的字节仍计入份额
+            self._vtime = start
+            self._tokens -= nbytes
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, [start, next(self._seq), nbytes, future])
+        self._reschedule()
+        await future
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        if self.rate is not None:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _reschedule(self) -> None:
+        """取消等待中的定时器，按当前速率重新放行"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._pump()
+
+    def _pump(self) -> None:
+        """按虚拟开始时间从小到大放行等待者，令牌为负时等到补足再继续"""
+        self._timer = None
+        self._refill()
+        while self._waiters:
+            start, _, nbytes, future = self._waiters[0]
+            if future.done() or future.get_loop().is_closed():
+                # 等待者已取消，或属于已关闭的事件循环
+                heapq.heappop(self._waiters)
+                continue
+            if self.rate is not None and self._tokens < 0:
+                self._timer = future.get_loop().call_later(-self._tokens / self.rate, self._pump)
+                return
+            heapq.heappop(self._waiters)
+            self._vtime = start
+            if self.rate is not None:
+                self._tokens -= nbytes
+            future.set_result(None)
+
+# 进程内所有下载器默认共用的带宽限制器，默认不限速
+bandwidth_limiter = BandwidthLimiter()
+
+# 文件系统或内核不支持零拷贝/预分配时的错误码，遇到这些错误时退回普通读写
+_UNSUPPORTED_ERRNOS = {errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EXDEV, errno.EBADF, errno.EPERM}
+
+def preallocate(fd: int, size: Optional[int]) -> bool:
+    """用 posix_fallocate 为文件预分配空间，减少碎片；不支持时返回 False"""
+    if not size or size <= 0 or not hasattr(os, 'posix_fallocate'):
+        return False
+    try:
+        os.posix_fallocate(fd, 0, size)
+        return True
+    except OSError as e:
+        if e.errno not in _UNSUPPORTED_ERRNOS:
+            raise
+        return False
+
+def copy_range(src_fd: int, dst_fd: int, count: int) -> None:
+    """从 src_fd 当前位置复制 count 字节到 dst_fd 当前位置
+
+    依次尝试 copy_file_range、sendfile（均在内核中完成），都不可用时退回用户态读写。
+    """
+    copied = 0
+    if hasattr(os, 'copy_file_range'):
+        try:
+            while copied < count:
+                n = os.copy_file_range(src_fd, dst_fd, count - copied)
+                if n == 0:
+                    break
+                copied += n
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED_ERRNOS:
+                raise
+    if copied < count and hasattr(os, 'sendfile'):
+        try:
+            while copied < count:
+                n = os.sendfile(dst_fd, src_fd, None, count - copied)
+                if n == 0:
+                    break
+                copied += n
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED_ERRNOS:
+                raise
+    while copied < count:
+        chunk = os.read(src_fd, min(1024 * 1024, count - copied))
+        if not chunk:
+            break
+        view = memoryview(chunk)
+        while view:
+            view = view[os.write(dst_fd, view):]
+        copied += len(chunk)
+
+def pwrite_all(fd: int, data: bytes, offset: int) -> None:
+    """把 data 完整写入 fd 的 offset 处，不改变共享的文件位置；不支持 pwrite 的平台退回 lseek + write"""
+    view = memoryview(data)
+    while view:
+        if hasattr(os, 'pwrite'):
+            written = os.pwrite(fd, view, offset)
+        else:
+            # 两次调用之间没有 await，不会与其他协程交错
+            os.lseek(fd, offset, os.SEEK_SET)
+            written = os.write(fd, view)
+        view = view[written:]
+        offset += written
+
+class DownloadError(Exception):
+    """基础异常类，用于下载相关的错误"""
+    def __init__(self, message: str):
+        super().__init__(message)
+
+class SegmentDownloadError(DownloadError):
+    """当分片重试次数用尽仍下载失败时引发的异常"""
+    def __init__(self, url: str, retries: int):
+        message = f"分片下载失败（已重试 {retries} 次）：{url}"
+        super().__init__(message)
+
+class UnsupportedFileTypeError(DownloadError):
+    """当媒体文件类型不受支持时引发的异常"""
+    def __init__(self, file_type: FileType):
+        message = f"不支持的文件类型：{file_type}"
+        super().__init__(message)
+
+class RangeMismatchError(DownloadError):
+    """当服务器忽略 Range 请求头或返回的文件大小与预期不符时引发的异常，size 为服务器报告的实际大小"""
+    def __init__(self, url: str, size: Optional[int] = None):
+        self.size = size
+        message = f"服务器未按预期返回字节范围：{url}" + (f"，实际大小为 {size} 字节" if size is not None else "")
+        super().__init__(message)
+
+class UnsupportedEncryptionError(DownloadError):
+    """当分片的加密方式不受支持时引发的异常"""
+    def __init__(self, method: str):
+        message = f"不支持的加密方式：{method}"
+        super().__init__(message)
+
+class AESDecryptor:
+    """流式 AES-128-CBC 解密器，数据到达即解密，末尾去除 PKCS7 填充"""
+
+    def __init__(self, key: bytes, iv: bytes):
+        self._decryptor = Cipher(algorithms.AES(key), modes.CBC(iv)).decryptor()
+        self._unpadder = PKCS7(algorithms.AES.block_size).unpadder()
+
+    def update(self, chunk: bytes) -> bytes:
+        return self._unpadder.update(self._decryptor.update(chunk))
+
+    def finalize(self) -> bytes:
+        return self._unpadder.update(self._decryptor.finalize()) + self._unpadder.finalize()
+
+    @staticmethod
+    def segment_iv(segment: Segment) -> bytes:
+        """计算分片的 IV，未显式指定时使用媒体序列号（大端 16 字节）"""
+        if segment.key.iv:
+            return bytes.fromhex(segment.key.iv[2:] if segment.key.iv.lower().startswith('0x') else segment.key.iv)
+        return segment.sequence.to_bytes(16, 'big')
+
+class ReorderBuffer:
+    """把乱序完成的分片按序号顺序写入 sink；缓存的分片总大小达到 max_bytes 时，非紧接着的分片需等待前面的空缺被填上（背压）"""
+
+    def __init__(self, sink: BinaryIO, max_bytes: int, first_index: int = 0, task: Optional[TaskProgress] = None, offset: int = 0, on_write: Optional[Callable[[int, int, int], None]] = None):
+        self.sink = sink
+        self.max_bytes = max_bytes
+        self.next_index = first_index # 下一个应写出的分片序号
+        self.offset = offset # 下一个分片在 sink 中的偏移
+        self.buffered = 0 # 已缓存的字节数
+        self.task = task
+        self.on_write = on_write # 分片写出后回调 (序号, 偏移, 长度)，用于记录断点
+        self._pending: Dict[int, bytes] = {}
+        self._condition = asyncio.Condition()
+
+    async def put(self, index: int, data: bytes) -> None:
+        async with self._condition:
+            if index != self.next_index:
+                # 紧接着的分片永远不等待，保证空缺总能被填上；缓存为空时也放行，避免单个超大分片卡住
+                await self._condition.wait_for(
+                    lambda: index == self.next_index or self.buffered == 0 or self.buffered + len(data) <= self.max_bytes
+                )
+            if index != self.next_index:
+                self._pending[index] = data
+                self.buffered += len(data)
+                return
+            self._write(data)
+            while self.next_index in self._pending:
+                data = self._pending.pop(self.next_index)
+                self.buffered -= len(data)
+                self._write(data)
+            self._condition.notify_all()
+
+    def _write(self, data: bytes) -> None:
+        started = time.perf_counter()
+        self.sink.write(data)
+        if self.on_write is not None:
+            # 先落到文件再记录断点，避免记录的进度超前于文件内容
+            self.sink.flush()
+            self.on_write(self.next_index, self.offset, len(data))
+        if self.task is not None:
+            self.task.stage_seconds['disk'] += time.perf_counter() - started
+        self.offset += len(data)
+        self.next_index += 1
+
+class RangePlanner:
+    """把文件中尚未下载的区间切成连续的字节范围，范围大小按实测的单连接吞吐量调整
+
+    每个范围的目标耗时为 chunk_seconds；临近结尾时缩小范围，使各连接大致同时完成。
+    """
+
+    def __init__(self, holes: List[Tuple[int, int]], concurrency: int, min_chunk: int, max_chunk: int, chunk_seconds: float, first_index: int = 0):
+        self.holes = [(start, end) for start, end in holes if end > start] # [起点, 终点) 的列表
+        self.concurrency = concurrency
+        self.min_chunk = min_chunk
+        self.max_chunk = max_chunk
+        self.chunk_seconds = chunk_seconds
+        self.next_index = first_index
+        self.remaining = sum(end - start for start, end in self.holes)
+        self.chunk_size = min_chunk # 测得吞吐量之前使用最小范围，尽快得到第一个测量值
+        self._rate: Optional[float] = None # 单连接吞吐量的指数移动平均，单位：字节/秒
+
+    def next(self) -> Optional[Tuple[int, int, int]]:
+        """返回下一个范围 (序号, 偏移, 长度)，没有剩余时返回 None"""
+        if not self.holes:
+            return None
+        start, end = self.holes[0]
+        tail = -(-self.remaining // self.concurrency)
+        length = min(end - start, max(self.min_chunk, min(self.chunk_size, tail)))
+        if start + length == end:
+            self.holes.pop(0)
+        else:
+            self.holes[0] = (start + length, end)
+        self.remaining -= length
+        index = self.next_index
+        self.next_index += 1
+        return index, start, length
+
+    def observe(self, nbytes: int, seconds: float) -> None:
+        """记录一个范围的下载耗时并调整之后的范围大小"""
+        if seconds <= 0:
+            return
+        rate = nbytes / seconds
+        self._rate = rate if self._rate is None else 0.7 * self._rate + 0.3 * rate
+        self.chunk_size = int(min(self.max_chunk, max(self.min_chunk, self._rate * self.chunk_seconds)))
+
+async def run_workers(worker, count: int) -> None:
+    """并发运行 count 个 worker，任一出错时取消其余的并抛出该错误"""
+    tasks = [asyncio.ensure_future(worker()) for _ in range(count)]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
 
 class Downloader:
     """适配多种资源类型（m3u8, ts, m4s, mpd），支持断点续传、自动解密、自动合并（不负责混流），支持异步调用，支持查询任务进度，支持"""
+
+    range_min_chunk = 1024 * 1024 # 按字节范围下载时单个范围的最小长度，单位：字节
+    range_max_chunk = 32 * 1024 * 1024 # 单个范围的最大长度，单位：字节
+    range_chunk_seconds = 2.0 # 按实测吞吐量调整范围长度时，每个范围的目标耗时，单位：秒
+
+    def __init__(self, client: Optional[AsyncClient] = None, concurrency: int = 8, retries: int = 3, retry_delay: float = 1.0, metrics: Optional[Metrics] = None, buffer_size: int = 64 * 1024 * 1024, transport: Optional[AsyncBaseTransport] = None, bandwidth: Optional[BandwidthLimiter] = None):
+        # 未提供 client 时使用共享传输层，与适配器共用 DNS 缓存和连接；
+        # 并发的字节范围和分片需要各自的 TCP 连接，HTTP/2 会把它们复用到一条连接上，因此只用 HTTP/1.1
+        self.client = client if client is not None else create_client(transport, http2=False, follow_redirects=True, timeout=30)
+        self.concurrency = concurrency # 同时下载的分片数
+        self.retries = retries # 每个分片的最大重试次数
+        self.retry_delay = retry_delay # 重试的基础间隔，单位：秒
+        self.buffer_size = buffer_size # 等待按序写出的分片最多占用的内存，单位：字节
+        self.metrics = metrics if metrics is not None else default_metrics
+        self.bandwidth = bandwidth if bandwidth is not None else bandwidth_limiter # 默认与进程内其他下载器共享带宽
+        self._keys: Dict[str, asyncio.Task] = {} # 按 URI 缓存解密密钥
+        self._jobs: Dict[str, str] = {} # 任务进度名 -> 带宽限制器中的任务名
+
+    async def download(self, media: Media, output: str, spool: bool = False, completed: Optional[Dict[int, Tuple[int, int]]] = None, on_segment: Optional[Callable[[int, int, int], None]] = None, weight: float = 1.0, job: Optional[str] = None) -> Path:
+        """下载媒体资源到 output，返回输出文件路径；下载进度可通过 progress(output) 查询
+
+        默认把分片按序直接写入 output；spool 为 True 或存在上次留下的分片目录时，先把分片写入分片目录再合并。
+        completed 为上次已写入的分片 {序号: (偏移, 长度)}，据此从断点继续；每写入一个分片调用 on_segment(序号, 偏移, 长度)。
+        直接文件（TS、M4S、字幕）按字节范围并发下载，此时“分片”指字节范围。
+        weight 为该任务在带宽限制器中的权重，限速时按权重比例分配带宽。
+        job 为带宽限制器中的任务名，默认为 output；多个下载共用同一 job 时合计分配带宽，此时 weight 不生效，由调用方设置权重并在结束后移除。
+        无论成功与否任务进度都会标记为结束（失败时带有 error），不再需要时由调用方 metrics.remove_task(output) 移除。
+        """
+        output = Path(output)
+        shared = job is not None
+        job = job if shared else str(output)
+        if not shared:
+            self.bandwidth.set_weight(job, weight)
+        task = self.metrics.start_task(str(output))
+        self._jobs[task.name] = job
+        error = None
+        try:
+            await self._download(media, output, spool, completed, on_segment, task)
+            return output
+        except BaseException as e:
+            error = repr(e)
+            raise
+        finally:
+            self.metrics.finish_task(task, error)
+            del self._jobs[task.name]
+            if not shared:
+                self.bandwidth.remove_job(job)
+
+    async def _download(self, media: Media, output: Path, spool: bool, completed: Optional[Dict[int, Tuple[int, int]]], on_segment: Optional[Callable[[int, int, int], None]], task: TaskProgress) -> None:
+        if media.file_type in DIRECT_FILE_TYPES:
+            await self.download_file(media.url, output, media.headers, media.size, task, completed, on_segment)
+            return
+        if media.file_type not in (FileType.M3U8, FileType.MPD):
+            raise UnsupportedFileTypeError(media.file_type)
+        parts_dir = output.with_name(output.name + '.parts')
+        if spool or parts_dir.exists():
+            async with aclosing(self.iter_media_segments(media)) as playlist:
+                segments = [segment async for segment in playlist]
+            task.total_segments = len(segments)
+            parts_dir.mkdir(parents=True, exist_ok=True)
+            await self.download_segments(segments, parts_dir, media.headers, task)
+            started = time.perf_counter()
+            self.merge_segments([parts_dir / self._part_name(segment) for segment in segments], output, media.size)
+            task.stage_seconds['disk'] += time.perf_counter() - started
+            shutil.rmtree(parts_dir)
+        else:
+            # 边接收播放列表边下载，解析出第一个分片即可开始；
+            # 出错时 worker 被取消，播放列表生成器停在响应体中间，必须显式关闭才能及时释放连接
+            async with aclosing(self._counted(self.iter_media_segments(media), task)) as segments:
+                resume_index, resume_offset, first = await self._resume_point(segments, completed or {}, output)
+                # 播放列表为空时也要生成（空的）输出文件
+                with open(output, 'r+b' if resume_offset else 'wb') as sink:
+                    sink.truncate(resume_offset)
+                    sink.seek(resume_offset)
+                    preallocated = not resume_offset and preallocate(sink.fileno(), media.size)
+                    task.done_segments = resume_index
+                    buffer = ReorderBuffer(sink, self.buffer_size, resume_index, task, resume_offset, on_segment)
+                    async with aclosing(self._prepend(first, segments)) as pending:
+                        await self.stream_segments(pending, buffer, media.headers, task)
+                    if preallocated:
+                        # Media.size 只是估计值，去掉多分配的部分
+                        sink.truncate()
+
+    @staticmethod
+    async def _resume_point(segments: AsyncIterator[Segment], completed: Dict[int, Tuple[int, int]], output: Path) -> Tuple[int, int, Optional[Segment]]:
+        """返回可以续传的 (分片序号, 文件偏移, 第一个需要下载的分片)：从头开始连续且确实已在文件中的分片都可跳过"""
+        size = output.stat().st_size if output.exists() else 0
+        index, offset = 0, 0
+        async for segment in segments:
+            record = completed.get(segment.index)
+            if record is None or record[0] != offset or offset + record[1] > size:
+                return segment.index, offset, segment
+            index, offset = segment.index + 1, offset + record[1]
+        return index, offset, None
+
+    @staticmethod
+    async def _counted(segments: AsyncIterator[Segment], task: TaskProgress) -> AsyncIterator[Segment]:
+        """播放列表的分片数在解析完之前未知，边解析边累计；关闭时一并关闭 segments"""
+        async with aclosing(segments):
+            async for segment in segments:
+                task.total_segments += 1
+                yield segment
+
+    @staticmethod
+    async def _prepend(first: Optional[Segment], rest: AsyncIterator[Segment]) -> AsyncIterator[Segment]:
+        """先产出 first 再产出 rest 的其余分片，first 为空时表示 rest 已耗尽；关闭时一并关闭 rest"""
+        if first is None:
+            return
+        async with aclosing(rest):
+            yield first
+            async for segment in rest:
+                yield segment
+
+    async def download_file(self, url: str, output: Path, headers: Optional[Dict[str, str]] = None, size: Optional[int] = None, task: Optional[TaskProgress] = None, completed: Optional[Dict[int, Tuple[int, int]]] = None, on_segment: Optional[Callable[[int, int, int], None]] = None) -> None:
+        """按字节范围并发下载单个文件到预分配的 output，服务器不支持 Range 时退回单连接下载
+
+        size 为空时通过 HEAD 请求获取；completed 为上次已写入的范围 {序号: (偏移, 长度)}，据此只下载缺失的部分。
+        """
+        # 字节范围针对未压缩的内容
+        headers = {**(headers or {}), 'Accept-Encoding': 'identity'}
+        ranges = True
+        if size is None:
+            size, ranges = await self._probe_file(url, headers)
+        while size and ranges:
+            try:
+                await self._download_ranges(url, output, headers, size, task, completed or {}, on_segment)
+                return
+            except RangeMismatchError as e:
+                if e.size is None or e.size == size:
+                    break
+                # Media.size 与实际大小不符，按实际大小重新下载
+                size, completed = e.size, None
+        if task is not None:
+            task.total_segments, task.done_segments = 1, 0
+        with open(output, 'wb') as sink:
+            await self.fetch_segment(Segment(index=0, url=url), sink, headers, task)
+            length = sink.tell()
+        if on_segment is not None:
+            on_segment(0, 0, length)
+
+    async def _probe_file(self, url: str, headers: Optional[Dict[str, str]] = None) -> Tuple[Optional[int], bool]:
+        """通过 HEAD 请求获取文件大小，以及服务器是否可能支持 Range"""
+        try:
+            response = await self.client.head(url, headers=headers)
+        except HTTPError:
+            return None, False
+        self._record_response(response)
+        length = response.headers.get('Content-Length', '')
+        if response.is_error or not length.isdigit():
+            return None, False
+        return int(length), response.headers.get('Accept-Ranges', '').lower() != 'none'
+
+    async def _download_ranges(self, url: str, output: Path, headers: Dict[str, str], size: int, task: Optional[TaskProgress], completed: Dict[int, Tuple[int, int]], on_segment: Optional[Callable[[int, int, int], None]]) -> None:
+        # 文件大小与预期一致时才沿用上次的进度
+        resume = bool(completed) and output.exists() and output.stat().st_size == size
+        with open(output, 'r+b' if resume else 'wb', buffering=0) as sink:
+            fd = sink.fileno()
+            if not resume:
+                completed = {}
+                preallocate(fd, size)
+                sink.truncate(size)
+            planner = RangePlanner(
+                self._holes(completed, size), self.concurrency, self.range_min_chunk, self.range_max_chunk, self.range_chunk_seconds, max(completed, default=-1) + 1
+            )
+            if task is not None:
+                task.total_segments = task.done_segments = len(completed)
+
+            async def worker():
+                while (piece := planner.next()) is not None:
+                    index, offset, length = piece
+                    if task is not None:
+                        task.total_segments += 1
+                    started = time.perf_counter()
+                    await self.fetch_range(url, fd, offset, length, size, headers, task)
+                    elapsed = time.perf_counter() - started
+                    planner.observe(length, elapsed)
+                    if task is not None:
+                        task.done_segments += 1
+                        self.metrics.emit('segment_done', task=task.name, index=index, bytes=length, seconds=elapsed)
+                    if on_segment is not None:
+                        on_segment(index, offset, length)
+
+            await run_workers(worker, self.concurrency)
+
+    @staticmethod
+    def _holes(completed: Dict[int, Tuple[int, int]], size: int) -> List[Tuple[int, int]]:
+        """返回 [0, size) 中未被已完成范围覆盖的区间"""
+        holes, cursor = [], 0
+        for offset, length in sorted(completed.values()):
+            if offset > cursor:
+                holes.append((cursor, offset))
+            cursor = max(cursor, offset + length)
+        if cursor < size:
+            holes.append((cursor, size))
+        return holes
+
+    async def fetch_range(self, url: str, fd: int, offset: int, length: int, size: int, headers: Optional[Dict[str, str]] = None, task: Optional[TaskProgress] = None) -> None:
+        """下载文件的 [offset, offset + length) 并写入 fd 的相同位置，失败时从已收到的位置继续请求剩余部分"""
+        stages = task.stage_seconds if task is not None else {'network': 0.0, 'decrypt': 0.0, 'disk': 0.0, 'throttle': 0.0}
+        job = self._jobs.get(task.name, task.name) if task is not None else ''
+        started = time.perf_counter()
+        done = 0
+        for attempt in range(self.retries + 1):
+            try:
+                mark = time.perf_counter()
+                request_headers = {**(headers or {}), 'Range': f"bytes={offset + done}-{offset + length - 1}"}
+                async with self.client.stream('GET', url, headers=request_headers) as response:
+                    self._record_response(response)
+                    response.raise_for_status()
+                    self._check_range(response, url, size)
+                    async for chunk in response.aiter_bytes():
+                        received = time.perf_counter()
+                        stages['network'] += received - mark
+                        chunk = chunk[:length - done]
+                        pwrite_all(fd, chunk, offset + done)
+                        written = time.perf_counter()
+                        stages['disk'] += written - received
+                        done += len(chunk)
+                        if task is not None:
+                            task.add_bytes(len(chunk))
+                        await self.bandwidth.consume(job, len(chunk))
+                        mark = time.perf_counter()
+                        stages['throttle'] += mark - written
+                    # 读完响应体（而不是收满 length 就退出）连接才会放回连接池复用
+                if done == length:
+                    self.metrics.observe('range_seconds', time.perf_counter() - started)
+                    return
+                reason = 'IncompleteRange' # 连接提前结束，下次从断开处继续
+            except HTTPError as e:
+                reason = type(e).__name__
+            if attempt == self.retries:
+                break
+            self.metrics.inc('retries_total', component='downloader', reason=reason)
+            self.metrics.emit('retry', component='downloader', url=url, attempt=attempt + 1)
+            await asyncio.sleep(backoff_delay(attempt, self.retry_delay))
+        raise SegmentDownloadError(url, self.retries)
+
+    @staticmethod
+    def _check_range(response: Response, url: str, size: int) -> None:
+        """确认服务器按 Range 返回了部分内容，且报告的文件大小与预期一致"""
+        if response.status_code != 206:
+            raise RangeMismatchError(url)
+        total = response.headers.get('Content-Range', '').rpartition('/')[2]
+        if total.isdigit() and int(total) != size:
+            raise RangeMismatchError(url, int(total))
+
+    def progress(self, output: str) -> Optional[Dict[str, Any]]:
+        """查询下载任务的进度，任务不存在时返回 None"""
+        task = self.metrics.tasks.get(str(Path(output)))
+        return task.snapshot() if task else None
+
+    def _record_response(self, response: Response) -> None:
+        self.metrics.inc('http_responses_total', endpoint=response.request.url.host, status=response.status_code)
+
+    async def download_all(self, jobs: List[Tuple[Media, str]], weight: float = 1.0, job: Optional[str] = None) -> List[Path]:
+        """并发下载多个媒体资源（如 DASH 的视频和音频），返回输出文件路径；任一失败时取消其余的并抛出该错误
+
+        所有输出在带宽限制器中作为同一个任务 job（默认由各输出路径拼接而成），按 weight 与其他任务分配带宽，
+        一集的视频和音频合计只占一份带宽。
+        """
+        job = job if job is not None else ' + '.join(str(output) for _, output in jobs)
+        self.bandwidth.set_weight(job, weight)
+        tasks = [asyncio.ensure_future(self.download(media, output, job=job)) for media, output in jobs]
+        try:
+            return list(await asyncio.gather(*tasks))
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        finally:
+            self.bandwidth.remove_job(job)
+
+    def iter_media_segments(self, media: Media) -> AsyncIterator[Segment]:
+        """按文件类型逐个产出 HLS 或 DASH 媒体的分片"""
+        if media.file_type == FileType.MPD:
+            return self.iter_dash(media.url, media.headers, media.representation_id)
+        return self.iter_playlist(media.url, media.headers)
+
+    async def iter_playlist(self, url: str, headers: Optional[Dict[str, str]] = None) -> AsyncIterator[Segment]:
+        """边接收边解析媒体播放列表，读到一个分片就产出一个；若为主播放列表则展开码率最高的子列表"""
+        async with self.client.stream('GET', url, headers=headers) as response:
+            self._record_response(response)
+            response.raise_for_status()
+            parser = PlaylistParser(str(response.url))
+            async for text in response.aiter_text():
+                for segment in parser.feed(text):
+                    yield segment
+            for segment in parser.close():
+                yield segment
+        if parser.is_variant:
+            async with aclosing(self.iter_playlist(parser.best_variant().url, headers)) as segments:
+                async for segment in segments:
+                    yield segment
+
+    async def iter_dash(self, url: str, headers: Optional[Dict[str, str]] = None, representation_id: Optional[str] = None) -> AsyncIterator[Segment]:
+        """获取 MPD 并逐个产出 Representation 的分片（未指定时为码率最高的视频），初始化分片在最前面且只出现一次
+
+        MPD 是 XML，需要完整接收后才能解析；SegmentTemplate/SegmentTimeline 的分片地址在迭代时才展开。
+        """
+        response = await self.client.get(url, headers=headers)
+        self._record_response(response)
+        response.raise_for_status()
+        representation = parse_mpd(response.text, str(response.url)).representation(representation_id)
+        if representation.protected:
+            raise UnsupportedEncryptionError('CENC')
+        for segment in iter_segments(representation):
+            yield segment
+
+    async def download_segments(self, segments: List[Segment], parts_dir: Path, headers: Optional[Dict[str, str]] = None, task: Optional[TaskProgress] = None) -> None:
+        """并发下载分片到 parts_dir，已存在的分片文件会被跳过"""
+        pending = [segment for segment in segments if not (parts_dir / self._part_name(segment)).exists()]
+        if task is not None:
+            task.done_segments = len(segments) - len(pending)
+        pending = iter(pending)
+
+        async def worker():
+            # 多个 worker 共享同一个迭代器，取到分片即下载
+            for segment in pending:
+                part = parts_dir / self._part_name(segment)
+                tmp = part.with_suffix('.tmp')
+                with open(tmp, 'wb') as sink:
+                    await self.fetch_segment(segment, sink, headers, task)
+                tmp.replace(part) # 写完再改名，避免留下半个分片
+
+        await run_workers(worker, self.concurrency)
+
+    async def stream_segments(self, segments: Iterable[Segment] | AsyncIterator[Segment], buffer: ReorderBuffer, headers: Optional[Dict[str, str]] = None, task: Optional[TaskProgress] = None) -> None:
+        """并发下载分片到内存，经 buffer 按序写出，不产生临时文件；segments 可以是边解析边产出的异步迭代器"""
+        if hasattr(segments, '__anext__'):
+            # 异步生成器不能被多个 worker 同时推进
+            lock = asyncio.Lock()
+
+            async def next_segment() -> Optional[Segment]:
+                async with lock:
+                    return await anext(segments, None)
+        else:
+            pending = iter(segments)
+
+            async def next_segment() -> Optional[Segment]:
+                return next(pending, None)
+
+        async def worker():
+            while (segment := await next_segment()) is not None:
+                sink = io.BytesIO()
+                await self.fetch_segment(segment, sink, headers, task)
+                # 缓存已满时在此等待，暂停领取新的分片
+                await buffer.put(segment.index, sink.getvalue())
+
+        await run_workers(worker, self.concurrency)
+
+    async def fetch_segment(self, segment: Segment, sink: BinaryIO, headers: Optional[Dict[str, str]] = None, task: Optional[TaskProgress] = None) -> None:
+        """流式下载单个分片并写入 sink，加密分片边下载边解密，失败时按指数间隔重试"""
+        request_headers = dict(headers or {})
+        if segment.byte_range:
+            length, offset = segment.byte_range
+            request_headers['Range'] = f"bytes={offset}-{offset + length - 1}"
+        # 分别统计等待网络、解密、写盘和限速的耗时，用于判断瓶颈
+        stages = task.stage_seconds if task is not None else {'network': 0.0, 'decrypt': 0.0, 'disk': 0.0, 'throttle': 0.0}
+        job = self._jobs.get(task.name, task.name) if task is not None else ''
+        started = time.perf_counter()
+        for attempt in range(self.retries + 1):
+            nbytes = 0
+            try:
+                decryptor = await self._segment_decryptor(segment, headers)
+                mark = time.perf_counter()
+                async with self.client.stream('GET', segment.url, headers=request_headers) as response:
+                    self._record_response(response)
+                    response.raise_for_status()
+                    async for chunk in response.aiter_bytes():
+                        received = time.perf_counter()
+                        stages['network'] += received - mark
+                        if decryptor:
+                            chunk = decryptor.update(chunk)
+                            decrypted = time.perf_counter()
+                            stages['decrypt'] += decrypted - received
+                        else:
+                            decrypted = received
+                        sink.write(chunk)
+                        written = time.perf_counter()
+                        stages['disk'] += written - decrypted
+                        nbytes += len(chunk)
+                        if task is not None:
+                            task.add_bytes(len(chunk))
+                        await self.bandwidth.consume(job, len(chunk))
+                        mark = time.perf_counter()
+                        stages['throttle'] += mark - written
+                if decryptor:
+                    sink.write(decryptor.finalize())
+                elapsed = time.perf_counter() - started
+                self.metrics.observe('segment_seconds', elapsed)
+                if task is not None:
+                    task.done_segments += 1
+                    self.metrics.emit('segment_done', task=task.name, index=segment.index, bytes=nbytes, seconds=elapsed)
+                return
+            except HTTPError as e:
+                # 丢弃本次写入的不完整数据
+                sink.seek(0)
+                sink.truncate()
+                if task is not None:
+                    task.add_bytes(-nbytes)
+                if attempt == self.retries:
+                    break
+                self.metrics.inc('retries_total', component='downloader', reason=type(e).__name__)
+                self.metrics.emit('retry', component='downloader', url=segment.url, attempt=attempt + 1)
+                await asyncio.sleep(backoff_delay(attempt, self.retry_delay))
+        raise SegmentDownloadError(segment.url, self.retries)
+
+    async def _segment_decryptor(self, segment: Segment, headers: Optional[Dict[str, str]] = None) -> Optional[AESDecryptor]:
+        """为加密分片创建解密器，未加密时返回 None"""
+        if segment.key is None:
+            return None
+        if segment.key.method != 'AES-128':
+            raise UnsupportedEncryptionError(segment.key.method)
+        key = await self.fetch_key(segment.key.url, headers)
+        return AESDecryptor(key, AESDecryptor.segment_iv(segment))
+
+    async def fetch_key(self, url: str, headers: Optional[Dict[str, str]] = None) -> bytes:
+        """获取解密密钥，同一 URI 只请求一次，并发请求共享同一个任务"""
+        task = self._keys.get(url)
+        if task is None:
+            task = self._keys[url] = asyncio.ensure_future(self._request_key(url, headers))
+        try:
+            return await asyncio.shield(task)
+        except HTTPError:
+            # 请求失败时移除缓存，以便下次重试
+            if self._keys.get(url) is task:
+                del self._keys[url]
+            raise
+
+    async def _request_key(self, url: str, headers: Optional[Dict[str, str]] = None) -> bytes:
+        response = await self.client.get(url, headers=headers)
+        self._record_response(response)
+        response.raise_for_status()
+        return response.content
+
+    @staticmethod
+    def merge_segments(parts: List[Path], output: Path, size: Optional[int] = None) -> None:
+        """按顺序合并分片文件，数据在内核中复制，不经过 Python；size 为空时按分片大小之和预分配"""
+        sizes = [part.stat().st_size for part in parts]
+        with open(output, 'wb', buffering=0) as out:
+            preallocated = preallocate(out.fileno(), size or sum(sizes))
+            for part, part_size in zip(parts, sizes):
+                with open(part, 'rb', buffering=0) as f:
+                    copy_range(f.fileno(), out.fileno(), part_size)
+            if preallocated:
+                out.truncate(out.tell())
+
+    @staticmethod
+    def _part_name(segment: Segment) -> str:
+        return f"{segment.index:06d}.ts"
+
+    async def close(self) -> None:
+        """关闭 HTTP 客户端"""
+        await self.client.aclose()
+
+    async def __aenter__(self) -> 'Downloader':
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        await self.close()
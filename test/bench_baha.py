@@ -0,0 +1,131 @@
+from AniDL.adapters import Adapter
+from AniDL.Models import Season, Episode, VideoMedia
+from AniDL.Cache import NullCache
+from AniDL.utils import Downloader, RateLimiter
+from AniDL.Transport import SharedTransport
+from httpx import Request, Response, URL
+from pathlib import Path
+import subprocess
+import tempfile
+import argparse
+import resource
+import asyncio
+import time
+import sys
+
+# 离线基准测试：在本地替身服务器（test/fake_baha.py）上测量解析与下载性能
+
+class LocalTransport(SharedTransport):
+    """把发往巴哈姆特的请求改写到本地替身服务器"""
+
+    def __init__(self, base_url: str, **kwargs):
+        super().__init__(**kwargs)
+        self.base_url = URL(base_url)
+
+    async def handle_async_request(self, request: Request) -> Response:
+        if request.url.host.endswith('gamer.com.tw'):
+            request.url = request.url.copy_with(scheme=self.base_url.scheme, host=self.base_url.host, port=self.base_url.port)
+        return await super().handle_async_request(request)
+
+def percentile(values: list, q: float) -> float:
+    """最近秩法计算百分位数"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered) + 0.5) - 1))]
+
+def report(name: str, latencies: list, elapsed: float, nbytes: int = 0) -> None:
+    throughput = f"{len(latencies) / elapsed:8.1f} 次/秒"
+    if nbytes:
+        throughput += f"，{nbytes / elapsed / 1024 / 1024:8.1f} MB/s"
+    print(f"{name:>14}: {len(latencies):4d} 次，{throughput}，p50 {percentile(latencies, 50) * 1000:8.1f} ms，p99 {percentile(latencies, 99) * 1000:8.1f} ms")
+
+def make_adapter(transport: LocalTransport) -> Adapter:
+    adapter = Adapter('baha', cache=NullCache(), transport=transport)
+    # 基准测试只关心自身开销，不限速
+    adapter.adapter.rate_limiter = RateLimiter(1e9, 1e9)
+    return adapter
+
+def clear_registry() -> None:
+    for model in (Season, Episode, VideoMedia):
+        model.clear_all_instances()
+
+async def bench_parse_playurl(adapter: Adapter, iterations: int) -> None:
+    latencies = []
+    start = time.perf_counter()
+    for i in range(iterations):
+        clear_registry()
+        t = time.perf_counter()
+        await adapter.parse_playurl(f'https://ani.gamer.com.tw/animeVideo.php?sn={1000 + i * 100}')
+        latencies.append(time.perf_counter() - t)
+    report('parse_playurl', latencies, time.perf_counter() - start)
+
+async def bench_parse_stream(adapter: Adapter, episodes: list, concurrency: int) -> None:
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def parse(episode: Episode):
+        async with semaphore:
+            t = time.perf_counter()
+            await adapter.parse_stream(episode)
+            latencies.append(time.perf_counter() - t)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(parse(episode) for episode in episodes))
+    report('parse_stream', latencies, time.perf_counter() - start)
+
+async def bench_download(adapter: Adapter, episodes: list, concurrency: int, transport: LocalTransport) -> None:
+    latencies = []
+    nbytes = 0
+    async with Downloader(concurrency=concurrency, transport=transport) as downloader:
+        with tempfile.TemporaryDirectory() as workdir:
+            start = time.perf_counter()
+            for episode in episodes:
+                video_medias, _, _ = await adapter.parse_stream(episode)
+                best = max(video_medias, key=lambda media: media.biterate or 0)
+                output = Path(workdir) / f'{episode.episode_id}.ts'
+                t = time.perf_counter()
+                await downloader.download(best, output)
+                latencies.append(time.perf_counter() - t)
+                nbytes += output.stat().st_size
+                output.unlink()
+            report('download', latencies, time.perf_counter() - start, nbytes)
+
+async def run(base_url: str, args: argparse.Namespace) -> None:
+    # 适配器与下载器共用同一个传输层
+    transport = LocalTransport(base_url)
+    async with make_adapter(transport) as adapter:
+        await bench_parse_playurl(adapter, args.iterations)
+        clear_registry()
+        _, episodes = await adapter.parse_playurl('https://ani.gamer.com.tw/animeVideo.php?sn=1000')
+        await bench_parse_stream(adapter, episodes, args.concurrency)
+        await bench_download(adapter, episodes[:args.downloads], args.concurrency, transport)
+    # Linux 上 ru_maxrss 的单位为 KB
+    print(f"{'peak RSS':>14}: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MB")
+
+def main():
+    parser = argparse.ArgumentParser(description='离线基准测试')
+    parser.add_argument('--latency', type=float, default=20, help='每个请求的额外延迟，单位：毫秒')
+    parser.add_argument('--bandwidth', type=float, default=0, help='每个连接的带宽，单位：MB/s，0 表示不限')
+    parser.add_argument('--episodes', type=int, default=24)
+    parser.add_argument('--segments', type=int, default=60)
+    parser.add_argument('--segment-size', type=int, default=512 * 1024)
+    parser.add_argument('--iterations', type=int, default=20, help='parse_playurl 的次数')
+    parser.add_argument('--downloads', type=int, default=2, help='完整下载的集数')
+    parser.add_argument('--concurrency', type=int, default=8)
+    args = parser.parse_args()
+    server = subprocess.Popen(
+        [
+            sys.executable, '-m', 'test.fake_baha',
+            '--latency', str(args.latency), '--bandwidth', str(args.bandwidth),
+            '--episodes', str(args.episodes), '--segments', str(args.segments), '--segment-size', str(args.segment_size),
+        ],
+        stdout=subprocess.PIPE, text=True, cwd=Path(__file__).resolve().parent.parent
+    )
+    try:
+        base_url = server.stdout.readline().strip()
+        asyncio.run(run(base_url, args))
+    finally:
+        server.terminate()
+        server.wait()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,31 @@
+from pathlib import Path
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = Path(__file__).resolve().parent.parent
+RUNS = 15
+
+# (名称, 子进程的解释器参数)
+CASES = [
+    ('python 启动', ['-c', 'pass']),
+    ('链接分发', ['-c', "from AniDL.adapters import find_adapter_name; find_adapter_name('https://ani.gamer.com.tw/animeVideo.php?sn=1')"]),
+    ('CLI --help', ['-m', 'AniDL', '--help']),
+    ('Adapter', ['-c', 'from AniDL.adapters import Adapter']),
+    ('BahaAdapter', ['-c', "from AniDL.adapters import Adapter; Adapter('baha', cache=__import__('AniDL.Cache').Cache.NullCache())"]),
+]
+
+def measure(arguments: list) -> list:
+    """每次启动新的解释器，返回各次的墙钟耗时"""
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *arguments], cwd=ROOT, check=True, stdout=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+if __name__ == '__main__':
+    for name, arguments in CASES:
+        timings = measure(arguments)
+        print(f"{name:>12}: 中位数 {statistics.median(timings) * 1000:7.1f} ms，最快 {min(timings) * 1000:7.1f} ms")
@@ -0,0 +1,75 @@
+from AniDL.Models import Episode, VideoMedia, UrlType, FileType, DRMType
+from AniDL.Snapshot import dump_registry, load_registry
+import tempfile
+import time
+import os
+
+EPISODES = 500
+VARIANTS = [(1920, 1080), (1280, 720), (854, 480), (640, 360)]
+
+episode_records = [
+    {'episode_id': i, 'episode_title': '', 'season_id': 1, 'episode_number': i}
+    for i in range(EPISODES)
+]
+video_records = [
+    {
+        'episode_id': i,
+        'url': f'https://example.com/{i}/{height}p.m3u8',
+        'url_type': UrlType.HTTPS,
+        'file_type': FileType.M3U8,
+        'headers': {'Origin': 'https://ani.gamer.com.tw'},
+        'biterate': width * height,
+        'drm_type': DRMType.HLS,
+        'width': width,
+        'height': height,
+    }
+    for i in range(EPISODES) for width, height in VARIANTS
+]
+
+def validated():
+    episodes = [Episode(**record, namespace='bench') for record in episode_records]
+    videos = [VideoMedia(**record, namespace='bench') for record in video_records]
+    return episodes, videos
+
+def trusted():
+    episodes = Episode.construct_many(episode_records, namespace='bench')
+    videos = VideoMedia.construct_many(video_records, namespace='bench')
+    return episodes, videos
+
+def snapshot(path: str):
+    return lambda: load_registry(path, namespace='bench')
+
+def measure(func, repeat: int = 10) -> float:
+    """返回多次构造中最快的一次耗时，只计构造本身，不计实例回收"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        instances = func()
+        best = min(best, time.perf_counter() - start)
+        del instances
+        Episode.clear_instances('bench')
+        VideoMedia.clear_instances('bench')
+    return best
+
+if __name__ == '__main__':
+    count = len(episode_records) + len(video_records)
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, 'registry.snapshot')
+        instances = trusted()
+        dump_registry(path, namespace='bench', models=[Episode, VideoMedia])
+        del instances
+        print(f"{'snapshot size':>15}: {os.path.getsize(path) / 1024:8.1f} KB")
+        for name, func in [('__init__', validated), ('construct_many', trusted), ('load_registry', snapshot(path))]:
+            best = measure(func)
+            print(f"{name:>15}: {best * 1000:8.2f} ms / {count} 个实例，{best / count * 1e6:6.2f} µs/个")
+    # 主键查找应为 O(1)，与命名空间中的实例数无关
+    lookups = 2000
+    for size in (EPISODES, 50000):
+        episodes = Episode.construct_many([{'episode_id': i, 'episode_title': '', 'season_id': 1, 'episode_number': i} for i in range(size)], namespace='bench')
+        start = time.perf_counter()
+        for i in range(lookups):
+            Episode.get(i % size, namespace='bench')
+        elapsed = time.perf_counter() - start
+        print(f"{'get':>15}: {elapsed * 1000:8.2f} ms / {lookups} 次查找，命名空间中 {size} 个实例")
+        del episodes
+        Episode.clear_instances('bench')
@@ -0,0 +1,86 @@
+from AniDL.utils import BandwidthLimiter
+import asyncio
+import sys
+
+# 检查带宽限制器的公平队列：份额按放行的字节数统计而不是按墙钟时间，结果不受机器快慢影响
+
+CHUNK = 16 * 1024
+
+async def weighted_share(weights: dict, workers: int, total: int) -> dict:
+    """每个任务开 workers 个协程不停消耗 CHUNK 字节，模拟并发的范围下载；放行 total 字节后返回各任务得到的字节数
+
+    使用默认的桶容量（0.25 秒的流量，即 16 块），令牌充足时走无竞争的快速路径，快速路径放行的字节同样要计入公平队列。
+    """
+    limiter = BandwidthLimiter(64 * CHUNK)
+    for job, weight in weights.items():
+        limiter.set_weight(job, weight)
+    granted = dict.fromkeys(weights, 0)
+    finished = asyncio.Event()
+
+    async def worker(job: str):
+        while not finished.is_set():
+            await limiter.consume(job, CHUNK)
+            granted[job] += CHUNK
+            if sum(granted.values()) >= total:
+                finished.set()
+            # 让出一次事件循环，相当于等待下一块数据到达
+            await asyncio.sleep(0)
+
+    tasks = [asyncio.create_task(worker(job)) for job in weights for _ in range(workers)]
+    await finished.wait()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    limiter.set_rate(None)
+    return granted
+
+async def check_weights() -> bool:
+    ok = True
+    for weights, workers in (({'a': 1, 'b': 3}, 1), ({'a': 1, 'b': 3}, 4), ({'a': 1, 'b': 1, 'c': 2}, 3)):
+        granted = await weighted_share(weights, workers, 96 * CHUNK)
+        base = min(weights, key=weights.get)
+        ratios = {job: granted[job] / granted[base] for job in weights}
+        # 所有任务一直在排队，放行顺序只取决于虚拟时间，份额应与权重严格成比例
+        expected = {job: 96 * CHUNK * weight // sum(weights.values()) for job, weight in weights.items()}
+        passed = granted == expected
+        ok &= passed
+        shares = '，'.join(f"{job}={ratios[job]:.2f}" for job in weights)
+        print(f"{'权重':>6}: {'通过' if passed else '失败'}，权重 {weights}，每任务 {workers} 个协程，实际比例 {shares}")
+    return ok
+
+async def check_unlimit() -> bool:
+    """限速极低时排队的等待者应在 set_rate(None) 后立即放行，之后的调用不再等待"""
+    limiter = BandwidthLimiter(1024, 1024)
+    await limiter.consume('a', 1024 * 1024) # 透支令牌，后续调用都需要排队
+    waiters = [asyncio.create_task(limiter.consume(job, 1024 * 1024)) for job in ('a', 'b', 'c')]
+    await asyncio.sleep(0.05)
+    pending = sum(not task.done() for task in waiters)
+    limiter.set_rate(None)
+    done, _ = await asyncio.wait(waiters, timeout=1)
+    await asyncio.wait_for(limiter.consume('a', 1024 * 1024), 0.1)
+    passed = pending == len(waiters) and len(done) == len(waiters) and not limiter._waiters
+    print(f"{'取消限速':>6}: {'通过' if passed else '失败'}，取消前 {pending} 个等待者，取消后放行 {len(done)} 个")
+    return passed
+
+async def check_cancel() -> bool:
+    """取消的等待者不应占用令牌，也不应挡住后面的等待者"""
+    limiter = BandwidthLimiter(64 * CHUNK, CHUNK)
+    await limiter.consume('a', 4 * CHUNK) # 令牌透支约 4 块，后续调用需要排队
+    cancelled = asyncio.create_task(limiter.consume('a', 1024 * CHUNK))
+    await asyncio.sleep(0)
+    cancelled.cancel()
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    await asyncio.wait_for(limiter.consume('b', CHUNK), 1)
+    elapsed = loop.time() - started
+    # 只需补足透支的 4 块（约 0.06 秒），若被取消的 1024 块挡住则需要 16 秒
+    passed = cancelled.cancelled() and elapsed < 0.5 and not limiter._waiters
+    print(f"{'取消等待':>6}: {'通过' if passed else '失败'}，后续等待者 {elapsed * 1000:.0f} ms 后放行")
+    return passed
+
+async def main() -> int:
+    results = [await check_weights(), await check_unlimit(), await check_cancel()]
+    return 0 if all(results) else 1
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main()))
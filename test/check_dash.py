@@ -0,0 +1,159 @@
+from AniDL.Dash import parse_mpd, iter_segments
+from itertools import islice
+import inspect
+import time
+import sys
+
+# 用固定的 MPD 检查分片展开：按 duration 计数的 SegmentTemplate、带 r=-1 的 SegmentTimeline、SegmentList 和 SegmentBase；
+# 期望值按 DASH 规范手工推算，并检查 iter_segments 是惰性的
+
+NUMBER_MPD = '''<?xml version="1.0"?>
+<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" mediaPresentationDuration="PT10S">
+  <BaseURL>https://cdn.example.com/dash/</BaseURL>
+  <Period>
+    <AdaptationSet contentType="video" mimeType="video/mp4">
+      <SegmentTemplate timescale="1000" duration="4000" startNumber="5" initialization="$RepresentationID$/init.mp4" media="$RepresentationID$/seg-$Number%05d$.m4s"/>
+      <Representation id="v1" bandwidth="3000000" width="1920" height="1080"/>
+      <Representation id="v2" bandwidth="800000" width="854" height="480"/>
+    </AdaptationSet>
+  </Period>
+</MPD>'''
+
+TIMELINE_MPD = '''<?xml version="1.0"?>
+<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" mediaPresentationDuration="PT20S">
+  <Period>
+    <AdaptationSet contentType="video">
+      <Representation id="v" bandwidth="2000000">
+        <SegmentTemplate timescale="90000" initialization="init-$Bandwidth$.mp4" media="chunk-$Time$.m4s">
+          <SegmentTimeline>
+            <S t="0" d="180000" r="2"/>
+            <S d="90000" r="-1"/>
+          </SegmentTimeline>
+        </SegmentTemplate>
+      </Representation>
+    </AdaptationSet>
+    <AdaptationSet contentType="audio" lang="ja">
+      <Representation id="a" bandwidth="128000">
+        <SegmentTemplate timescale="10" media="a-$Number$-$Time$.m4s">
+          <SegmentTimeline>
+            <S t="0" d="10" r="-1"/>
+            <S t="50" d="20" r="1"/>
+          </SegmentTimeline>
+        </SegmentTemplate>
+      </Representation>
+    </AdaptationSet>
+  </Period>
+</MPD>'''
+
+LIST_MPD = '''<?xml version="1.0"?>
+<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" mediaPresentationDuration="PT12S">
+  <Period>
+    <BaseURL>media/</BaseURL>
+    <AdaptationSet contentType="video">
+      <Representation id="ranges" bandwidth="1000000">
+        <BaseURL>video.mp4</BaseURL>
+        <SegmentList duration="6">
+          <Initialization range="0-999"/>
+          <SegmentURL mediaRange="1000-4999"/>
+          <SegmentURL mediaRange="5000-8999"/>
+        </SegmentList>
+      </Representation>
+      <Representation id="files" bandwidth="500000">
+        <SegmentList duration="6">
+          <Initialization sourceURL="files/init.mp4"/>
+          <SegmentURL media="files/s1.m4s"/>
+          <SegmentURL media="https://other.example.com/s2.m4s"/>
+        </SegmentList>
+      </Representation>
+      <Representation id="single" bandwidth="200000">
+        <BaseURL>full.mp4</BaseURL>
+        <SegmentBase><Initialization range="0-799"/></SegmentBase>
+      </Representation>
+    </AdaptationSet>
+  </Period>
+</MPD>'''
+
+LAZY_MPD = '''<?xml version="1.0"?>
+<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" mediaPresentationDuration="PT1S">
+  <Period>
+    <AdaptationSet contentType="video">
+      <Representation id="v" bandwidth="1">
+        <SegmentTemplate timescale="1" media="$Number$.m4s">
+          <SegmentTimeline><S t="0" d="1" r="999999"/></SegmentTimeline>
+        </SegmentTemplate>
+      </Representation>
+    </AdaptationSet>
+  </Period>
+</MPD>'''
+
+def timeline_times(start: int, duration: int, count: int) -> list:
+    return [start + duration * i for i in range(count)]
+
+# (MPD, MPD 地址, Representation ID, 期望的 [(地址, sequence, byte_range)])；初始化分片和 SegmentBase 没有序列号，sequence 为默认的 0
+CASES = [
+    ('number', NUMBER_MPD, 'https://cdn.example.com/dash/manifest.mpd?token=abc', None, [
+        ('https://cdn.example.com/dash/v1/init.mp4', 0, None),
+        ('https://cdn.example.com/dash/v1/seg-00005.m4s', 5, None),
+        ('https://cdn.example.com/dash/v1/seg-00006.m4s', 6, None),
+        ('https://cdn.example.com/dash/v1/seg-00007.m4s', 7, None), # ceil(10 / 4) = 3 个媒体分片
+    ]),
+    ('number', NUMBER_MPD, 'https://cdn.example.com/dash/manifest.mpd?token=abc', 'v2', [
+        ('https://cdn.example.com/dash/v2/init.mp4', 0, None),
+    ] + [(f'https://cdn.example.com/dash/v2/seg-0000{n}.m4s', n, None) for n in (5, 6, 7)]),
+    # 3 个 2 秒的分片之后，r=-1 的 1 秒分片重复到 Period 结束：(20 - 6) / 1 = 14 个
+    ('timeline', TIMELINE_MPD, 'https://cdn.example.com/tl/x.mpd', 'v', [
+        ('https://cdn.example.com/tl/init-2000000.mp4', 0, None),
+    ] + [
+        (f'https://cdn.example.com/tl/chunk-{t}.m4s', n, None)
+        for n, t in enumerate(timeline_times(0, 180000, 3) + timeline_times(540000, 90000, 14), start=1)
+    ]),
+    # r=-1 重复到下一个 S 的 t=50：5 个分片，之后是 t=50、70 两个分片
+    ('timeline', TIMELINE_MPD, 'https://cdn.example.com/tl/x.mpd', 'a', [
+        (f'https://cdn.example.com/tl/a-{n}-{t}.m4s', n, None) for n, t in enumerate([0, 10, 20, 30, 40, 50, 70], start=1)
+    ]),
+    ('list', LIST_MPD, 'https://cdn.example.com/vod/x/manifest.mpd', 'ranges', [
+        ('https://cdn.example.com/vod/x/media/video.mp4', 0, (1000, 0)),
+        ('https://cdn.example.com/vod/x/media/video.mp4', 1, (4000, 1000)),
+        ('https://cdn.example.com/vod/x/media/video.mp4', 2, (4000, 5000)),
+    ]),
+    ('list', LIST_MPD, 'https://cdn.example.com/vod/x/manifest.mpd', 'files', [
+        ('https://cdn.example.com/vod/x/media/files/init.mp4', 0, None),
+        ('https://cdn.example.com/vod/x/media/files/s1.m4s', 1, None),
+        ('https://other.example.com/s2.m4s', 2, None),
+    ]),
+    # SegmentBase：整个文件是一个分片
+    ('list', LIST_MPD, 'https://cdn.example.com/vod/x/manifest.mpd', 'single', [
+        ('https://cdn.example.com/vod/x/media/full.mp4', 0, None),
+    ]),
+]
+
+def check_case(name: str, text: str, url: str, representation_id: str, expected: list) -> bool:
+    representation = parse_mpd(text, url).representation(representation_id)
+    segments = list(iter_segments(representation))
+    actual = [(segment.url, segment.sequence, segment.byte_range) for segment in segments]
+    ok = actual == expected and [segment.index for segment in segments] == list(range(len(segments)))
+    detail = f"{len(segments)} 个分片"
+    if not ok:
+        mismatch = next((i for i, pair in enumerate(zip(actual, expected)) if pair[0] != pair[1]), min(len(actual), len(expected)))
+        detail += f"，期望 {len(expected)} 个，第 {mismatch} 个不同：{actual[mismatch] if mismatch < len(actual) else None} != {expected[mismatch] if mismatch < len(expected) else None}"
+    print(f"{name:>8} {representation.id:>6}: {'通过' if ok else '失败'}，{detail}")
+    return ok
+
+def check_lazy() -> bool:
+    """一百万个分片的 SegmentTimeline：只取前 3 个应立即返回，而不是先展开全部分片"""
+    representation = parse_mpd(LAZY_MPD, 'https://cdn.example.com/lazy/x.mpd').representation('v')
+    segments = iter_segments(representation)
+    started = time.perf_counter()
+    first = [segment.url for segment in islice(segments, 3)]
+    elapsed = time.perf_counter() - started
+    ok = inspect.isgenerator(segments) and elapsed < 0.1 and first == [f'https://cdn.example.com/lazy/{n}.m4s' for n in (1, 2, 3)]
+    print(f"{'lazy':>8} {representation.id:>6}: {'通过' if ok else '失败'}，取前 3 个分片用时 {elapsed * 1000:.2f} ms")
+    return ok
+
+def main() -> int:
+    results = [check_case(*case) for case in CASES]
+    results.append(check_lazy())
+    return 0 if all(results) else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
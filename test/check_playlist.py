@@ -0,0 +1,117 @@
+from AniDL.Playlist import PlaylistParser, Segment, SegmentKey
+from typing import List
+import random
+import sys
+import m3u8
+
+# 对比增量解析器与 m3u8 库在相同输入上的结果，输入在随机位置截断后分块喂入
+
+URL = 'https://cdn.example.com/hls/1234/chunklist_b3000000.m3u8?token=abc'
+
+def reference(text: str, url: str) -> List[Segment]:
+    """用 m3u8 库解析，字段换算与 Downloader 原先的实现相同；省略偏移的字节范围按规范接续同一资源上一个范围"""
+    playlist = m3u8.loads(text, uri=url)
+    segments = []
+    range_end = {}
+    for index, raw_segment in enumerate(playlist.segments):
+        byte_range = None
+        if raw_segment.byterange:
+            length, _, offset = raw_segment.byterange.partition('@')
+            offset = int(offset) if offset else range_end.get(raw_segment.absolute_uri, 0)
+            range_end[raw_segment.absolute_uri] = offset + int(length)
+            byte_range = (int(length), offset)
+        key = None
+        if raw_segment.key is not None and raw_segment.key.method != 'NONE':
+            key = SegmentKey(method=raw_segment.key.method, url=raw_segment.key.absolute_uri, iv=raw_segment.key.iv)
+        segments.append(
+            Segment(
+                index=index,
+                url=raw_segment.absolute_uri,
+                sequence=(playlist.media_sequence or 0) + index,
+                duration=raw_segment.duration,
+                byte_range=byte_range,
+                key=key
+            )
+        )
+    return segments
+
+def incremental(text: str, url: str, rng: random.Random) -> List[Segment]:
+    parser = PlaylistParser(url)
+    segments = []
+    position = 0
+    while position < len(text):
+        step = rng.randint(1, 64)
+        segments.extend(parser.feed(text[position:position + step]))
+        position += step
+    segments.extend(parser.close())
+    return segments
+
+def generate(rng: random.Random) -> str:
+    lines = ['#EXTM3U', '#EXT-X-VERSION:4', f'#EXT-X-TARGETDURATION:{rng.randint(2, 10)}']
+    if rng.random() < 0.7:
+        lines.append(f'#EXT-X-MEDIA-SEQUENCE:{rng.randint(0, 100000)}')
+    resources = ['media.ts', '../shared/media.mp4', 'https://other.example.com/abs/file.ts']
+    for i in range(rng.randint(0, 300)):
+        choice = rng.random()
+        if choice < 0.05:
+            lines.append('#EXT-X-KEY:METHOD=NONE')
+        elif choice < 0.12:
+            iv = f',IV=0x{rng.getrandbits(128):032x}' if rng.random() < 0.5 else ''
+            uri = rng.choice(['key.bin', '/keys/k?id=1,2', 'https://keys.example.com/k'])
+            lines.append(f'#EXT-X-KEY:METHOD=AES-128,URI="{uri}"{iv},KEYFORMAT="identity"')
+        if rng.random() < 0.05:
+            lines.append('#EXT-X-DISCONTINUITY')
+        if rng.random() < 0.03:
+            lines.append('')
+        lines.append(f'#EXTINF:{rng.uniform(0.5, 10):.3f},{rng.choice(["", "title", "a,b"])}')
+        if rng.random() < 0.2:
+            offset = f'@{rng.randint(0, 10 ** 7)}' if rng.random() < 0.5 else ''
+            lines.append(f'#EXT-X-BYTERANGE:{rng.randint(1, 10 ** 6)}{offset}')
+            lines.append(rng.choice(resources))
+        else:
+            lines.append(rng.choice([f'seg{i}.ts', f'/abs/seg{i}.ts?x=1', f'sub/dir/seg{i}.ts', f'https://cdn2.example.com/seg{i}.ts']))
+    if rng.random() < 0.8:
+        lines.append('#EXT-X-ENDLIST')
+    newline = rng.choice(['\n', '\r\n'])
+    return newline.join(lines) + (newline if rng.random() < 0.7 else '')
+
+def check_variant() -> None:
+    text = '\n'.join([
+        '#EXTM3U',
+        '#EXT-X-STREAM-INF:BANDWIDTH=800000,RESOLUTION=640x360,CODECS="avc1.4d401e,mp4a.40.2"',
+        'low/index.m3u8',
+        '#EXT-X-STREAM-INF:BANDWIDTH=6000000,RESOLUTION=1920x1080',
+        'https://cdn.example.com/high/index.m3u8',
+        '#EXT-X-STREAM-INF:BANDWIDTH=6000000,RESOLUTION=1920x1080',
+        'high2/index.m3u8',
+    ])
+    playlist = m3u8.loads(text, uri=URL)
+    expected = max(playlist.playlists, key=lambda p: p.stream_info.bandwidth or 0)
+    parser = PlaylistParser(URL)
+    parser.feed(text)
+    parser.close()
+    assert parser.is_variant
+    assert [variant.url for variant in parser.variants] == [p.absolute_uri for p in playlist.playlists]
+    assert parser.best_variant().url == expected.absolute_uri
+
+def main():
+    seed = int(sys.argv[1]) if len(sys.argv) > 1 else 0
+    rng = random.Random(seed)
+    check_variant()
+    cases = 500
+    for case in range(cases):
+        text = generate(rng)
+        expected = reference(text, URL)
+        actual = incremental(text, URL, rng)
+        if actual != expected:
+            for position, (a, e) in enumerate(zip(actual, expected)):
+                if a != e:
+                    print(f"用例 {case} 第 {position} 个分片不一致：\n  增量解析：{a}\n  m3u8   ：{e}")
+                    break
+            else:
+                print(f"用例 {case} 分片数不一致：{len(actual)} != {len(expected)}")
+            sys.exit(1)
+    print(f"{cases} 个播放列表的解析结果与 m3u8 一致")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+from AniDL.Transport import SharedTransport, create_client
+from AniDL.utils import Downloader
+from cryptography import x509
+from cryptography.x509.oid import NameOID
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from pathlib import Path
+import h2.connection
+import h2.config
+import h2.events
+import ipaddress
+import datetime
+import tempfile
+import asyncio
+import random
+import ssl
+import sys
+import h11
+
+# 在本地 TLS 服务器（同时支持 h2 和 http/1.1）上按字节范围下载，检查并发的范围使用了多条连接：
+# 同一服务器上默认的客户端会协商 HTTP/2 并把并发请求复用到一条连接上，下载器必须避开这一点；
+# 同时连接数不应超过并发数，即读完的连接放回连接池供后续范围复用
+
+SIZE = 4 * 1024 * 1024
+CONCURRENCY = 4
+LATENCY = 0.05 # 每个响应的延迟，单位：秒；让并发的范围请求在时间上重叠
+
+def make_certificate(workdir: Path) -> tuple:
+    """生成 127.0.0.1 的自签名证书，返回 (证书路径, 私钥路径, 证书 PEM)"""
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, '127.0.0.1')])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    certificate = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(x509.SubjectAlternativeName([x509.IPAddress(ipaddress.ip_address('127.0.0.1'))]), critical=False)
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .sign(key, hashes.SHA256())
+    )
+    pem = certificate.public_bytes(serialization.Encoding.PEM)
+    (workdir / 'cert.pem').write_bytes(pem)
+    (workdir / 'key.pem').write_bytes(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()))
+    return workdir / 'cert.pem', workdir / 'key.pem', pem.decode()
+
+class RangeServer:
+    """按 ALPN 协商的协议处理请求，记录每种协议建立的连接（以客户端端口区分）"""
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.connections = {'h2': set(), 'http/1.1': set()}
+
+    def respond(self, method: str, headers: dict) -> tuple:
+        """返回 (状态码, 响应头, 响应体)"""
+        if 'range' not in headers:
+            body = self.body if method == 'GET' else b''
+            return 200, [('content-length', str(len(self.body))), ('accept-ranges', 'bytes')], body
+        start, _, end = headers['range'].removeprefix('bytes=').partition('-')
+        start, end = int(start), min(int(end), len(self.body) - 1)
+        return 206, [('content-length', str(end - start + 1)), ('content-range', f'bytes {start}-{end}/{len(self.body)}')], self.body[start:end + 1]
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        protocol = writer.get_extra_info('ssl_object').selected_alpn_protocol() or 'http/1.1'
+        self.connections[protocol].add(writer.get_extra_info('peername')[1])
+        try:
+            await (self.serve_h2 if protocol == 'h2' else self.serve_h11)(reader, writer)
+        except (ConnectionError, h11.RemoteProtocolError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve_h11(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        connection = h11.Connection(h11.SERVER)
+        while True:
+            event = connection.next_event()
+            if event is h11.NEED_DATA:
+                data = await reader.read(65536)
+                if not data:
+                    return
+                connection.receive_data(data)
+            elif isinstance(event, h11.Request):
+                headers = {name.decode().lower(): value.decode() for name, value in event.headers}
+                status, response_headers, body = self.respond(event.method.decode(), headers)
+                await asyncio.sleep(LATENCY)
+                writer.write(connection.send(h11.Response(status_code=status, headers=response_headers)))
+                writer.write(connection.send(h11.Data(data=body)) if body else b'')
+                writer.write(connection.send(h11.EndOfMessage()))
+                await writer.drain()
+            elif isinstance(event, h11.EndOfMessage):
+                if connection.our_state is h11.MUST_CLOSE:
+                    return
+                connection.start_next_cycle()
+            elif isinstance(event, h11.ConnectionClosed):
+                return
+
+    async def serve_h2(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """只用于发送小的响应体，不处理流量控制"""
+        connection = h2.connection.H2Connection(config=h2.config.H2Configuration(client_side=False))
+        connection.initiate_connection()
+        writer.write(connection.data_to_send())
+
+        async def reply(stream_id: int, headers: dict) -> None:
+            status, response_headers, _ = self.respond('HEAD', headers)
+            await asyncio.sleep(LATENCY)
+            connection.send_headers(stream_id, [(':status', str(status)), ('content-length', '0')] + response_headers[1:], end_stream=True)
+            writer.write(connection.data_to_send())
+
+        replies = []
+        while data := await reader.read(65536):
+            for event in connection.receive_data(data):
+                if isinstance(event, h2.events.RequestReceived):
+                    headers = {name.decode() if isinstance(name, bytes) else name: value.decode() if isinstance(value, bytes) else value for name, value in event.headers}
+                    replies.append(asyncio.create_task(reply(event.stream_id, headers)))
+            writer.write(connection.data_to_send())
+            await writer.drain()
+
+async def main() -> int:
+    body = random.Random(0).randbytes(SIZE)
+    server = RangeServer(body)
+    with tempfile.TemporaryDirectory() as workdir:
+        workdir = Path(workdir)
+        cert, key, pem = make_certificate(workdir)
+        server_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        server_context.load_cert_chain(cert, key)
+        server_context.set_alpn_protocols(['h2', 'http/1.1'])
+        listener = await asyncio.start_server(server.handle, '127.0.0.1', 0, ssl=server_context)
+        url = f"https://127.0.0.1:{listener.sockets[0].getsockname()[1]}/video.ts"
+        client_context = ssl.create_default_context(cadata=pem)
+        transport = SharedTransport(ssl_context=client_context)
+        try:
+            # 同一传输层上的普通客户端会协商 HTTP/2，并发请求只占一条连接
+            async with create_client(transport) as client:
+                await asyncio.gather(*(client.head(url) for _ in range(8)))
+            multiplexed = len(server.connections['h2'])
+            async with Downloader(transport=transport, concurrency=CONCURRENCY) as downloader:
+                downloader.range_min_chunk = downloader.range_max_chunk = SIZE // 16
+                output = workdir / 'video.ts'
+                await downloader.download_file(url, output)
+            intact = output.read_bytes() == body
+        finally:
+            listener.close()
+            await listener.wait_closed()
+    ranges = len(server.connections['http/1.1'])
+    results = [
+        ('HTTP/2 复用', multiplexed == 1, f"8 个并发请求使用 {multiplexed} 条 h2 连接"),
+        ('范围并发', 1 < ranges <= CONCURRENCY and len(server.connections['h2']) == multiplexed, f"16 个范围使用 {ranges} 条 http/1.1 连接（并发数 {CONCURRENCY}），{len(server.connections['h2']) - multiplexed} 条新的 h2 连接"),
+        ('内容', intact, '与服务器上的文件一致' if intact else '与服务器上的文件不一致'),
+    ]
+    for name, ok, detail in results:
+        print(f"{name:>10}: {'通过' if ok else '失败'}，{detail}")
+    return 0 if all(ok for _, ok, _ in results) else 1
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,97 @@
+from AniDL.adapters import Adapter
+from AniDL.Models import Season, Episode, VideoMedia
+from AniDL.Cache import SQLiteCache
+from AniDL.Journal import Journal, JobStatus
+from AniDL.Scheduler import DownloadScheduler, AdapterNotConfiguredError
+from AniDL.utils import Downloader
+from test.bench_baha import LocalTransport
+from test.fake_baha import FakeBahaServer
+from pathlib import Path
+import threading
+import tempfile
+import asyncio
+import sys
+
+# 在本地替身服务器上走一遍 parse_playurl -> parse_stream -> submit -> run，覆盖调度器重新解析签名地址的路径：
+# 正常下载、签名按 stream_ttl 过期、播放列表返回 403（缓存中的签名已被吊销）、进程重启后由 adapter_factory 创建适配器续传
+
+PLAYURL = 'https://ani.gamer.com.tw/animeVideo.php?sn=1000'
+
+async def run_case(name: str, server: FakeBahaServer, workdir: Path, prepare) -> bool:
+    for model in (Season, Episode, VideoMedia):
+        model.clear_all_instances()
+    transport = LocalTransport(server.base_url)
+    # 签名地址缓存在适配器的内存缓存中，403 时必须绕过其中被拒绝的地址才能成功
+    async with Adapter('baha', cache=SQLiteCache(':memory:'), transport=transport) as adapter, Downloader(transport=transport) as downloader:
+        _, episodes = await adapter.parse_playurl(PLAYURL)
+        video_medias, _, _ = await adapter.parse_stream(episodes[0])
+        media = max(video_medias, key=lambda media: media.biterate or 0)
+        journal = Journal(workdir / f'{name}.sqlite3')
+        scheduler = DownloadScheduler(downloader, journal, adapters={'baha': adapter})
+        job = scheduler.submit('baha', episodes[0], media, str(workdir / f'{name}.ts'))
+        prepare(journal, job)
+        # 调用方在整个运行期间都持有 media，重新解析不能因为实例已登记而失败
+        results = await scheduler.run()
+        job = journal.get_job(job.job_id)
+        journal.close()
+    ok = results.get(job.job_id) == JobStatus.DONE and Path(job.output).stat().st_size > 0
+    print(f"{name:>8}: {'通过' if ok else '失败'}，{results.get(job.job_id)}，{job.error or job.media['url']}")
+    return ok
+
+def expire(journal: Journal, job) -> None:
+    journal.conn.execute('UPDATE jobs SET resolved_at = 0 WHERE job_id = ?', (job.job_id,))
+
+def revoke(server: FakeBahaServer):
+    def prepare(journal: Journal, job) -> None:
+        server.revoked.update(str(signature) for signature in range(server.signatures))
+    return prepare
+
+async def restart_case(server: FakeBahaServer, workdir: Path) -> bool:
+    """提交后不运行即"退出"，新的调度器没有现成的适配器：未提供 adapter_factory 时应立即报错，提供时应能续传"""
+    for model in (Season, Episode, VideoMedia):
+        model.clear_all_instances()
+    transport = LocalTransport(server.base_url)
+    path = workdir / 'restart.sqlite3'
+    async with Adapter('baha', cache=SQLiteCache(':memory:'), transport=transport) as adapter, Downloader(transport=transport) as downloader:
+        _, episodes = await adapter.parse_playurl(PLAYURL)
+        video_medias, _, _ = await adapter.parse_stream(episodes[0])
+        journal = Journal(path)
+        job = DownloadScheduler(downloader, journal, adapters={'baha': adapter}).submit('baha', episodes[0], video_medias[0], str(workdir / 'restart.ts'))
+        expire(journal, job)
+        journal.close()
+    async with Downloader(transport=transport) as downloader:
+        journal = Journal(path)
+        try:
+            await DownloadScheduler(downloader, journal).run()
+            refused = False
+        except AdapterNotConfiguredError:
+            refused = True
+        scheduler = DownloadScheduler(downloader, journal, adapter_factory=lambda name: Adapter(name, cache=SQLiteCache(':memory:'), transport=transport))
+        try:
+            results = await scheduler.run()
+        finally:
+            await scheduler.close()
+        job = journal.get_job(job.job_id)
+        journal.close()
+    ok = refused and results.get(job.job_id) == JobStatus.DONE
+    print(f"{'restart':>8}: {'通过' if ok else '失败'}，未提供适配器时{'拒绝运行' if refused else '没有报错'}，{results.get(job.job_id)}，{job.error or job.media['url']}")
+    return ok
+
+async def main() -> int:
+    server = FakeBahaServer(('127.0.0.1', 0), episodes=4, segments=4, segment_size=4096)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            workdir = Path(workdir)
+            results = [
+                await run_case('fresh', server, workdir, lambda journal, job: None),
+                await run_case('ttl', server, workdir, expire),
+                await run_case('revoked', server, workdir, revoke(server)),
+                await restart_case(server, workdir),
+            ]
+    finally:
+        server.shutdown()
+    return 0 if all(results) else 1
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main()))
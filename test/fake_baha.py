@@ -0,0 +1,142 @@
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.padding import PKCS7
+import argparse
+import json
+import time
+import re
+
+# 巴哈姆特 API 与 HLS 源站的本地替身，用于离线基准测试
+
+KEY = bytes(range(16))
+IV = '0x00000000000000000000000000000001'
+VARIANTS = [(1920, 1080, 6000000), (1280, 720, 3000000), (640, 360, 800000)]
+
+class FakeBahaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency: float = 0.0, bandwidth: float = 0.0, episodes: int = 24, segments: int = 60, segment_size: int = 512 * 1024):
+        super().__init__(address, FakeBahaHandler)
+        self.latency = latency # 每个请求的额外延迟，单位：秒
+        self.bandwidth = bandwidth # 每个连接的带宽，单位：字节/秒，0 表示不限
+        self.episodes = episodes
+        self.segments = segments
+        self.signatures = 0 # 已签发的播放地址数，每次请求 m3u8.php 签发一个新签名
+        self.revoked = set() # 已吊销的签名，使用它们的播放列表请求返回 403，模拟签名过期
+        # 所有分片共用同一段密文，解密后内容相同
+        padder = PKCS7(algorithms.AES.block_size).padder()
+        plain = padder.update(b'\x47' * segment_size) + padder.finalize()
+        encryptor = Cipher(algorithms.AES(KEY), modes.CBC(bytes.fromhex(IV[2:]))).encryptor()
+        self.segment = encryptor.update(plain) + encryptor.finalize()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+class FakeBahaHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' # 保持连接，与真实 CDN 一致
+    server: FakeBahaServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        url = urlsplit(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        path = url.path
+        if path == '/ajax/getdeviceid.php':
+            return self._json({'deviceid': 'fake-device'})
+        if path == '/anime/v1/video.php':
+            return self._json(self._anime(int(query['videoSn'])))
+        if path == '/animeRef.php':
+            return self._redirect(f"https://ani.gamer.com.tw/animeVideo.php?sn={query['sn']}")
+        if path == '/ajax/m3u8.php':
+            signature = self.server.signatures
+            self.server.signatures += 1
+            return self._json({'src': f"{self.server.base_url}/hls/{query['sn']}/playlist_advance.m3u8?sig={signature}"})
+        if query.get('sig') in self.server.revoked:
+            return self._send(b'signature expired', 'text/plain', status=403)
+        if path.endswith('/playlist_advance.m3u8'):
+            return self._send(self._master(query.get('sig', '0')).encode(), 'application/vnd.apple.mpegurl')
+        match = re.fullmatch(r'/hls/\d+/chunklist_b(\d+)\.m3u8', path)
+        if match:
+            return self._send(self._media(match.group(1)).encode(), 'application/vnd.apple.mpegurl')
+        if path.endswith('/key.bin'):
+            return self._send(KEY, 'application/octet-stream')
+        if re.fullmatch(r'/hls/\d+/b\d+_\d+\.ts', path):
+            return self._send(self.server.segment, 'video/mp2t')
+        self._send(b'not found', 'text/plain', status=404)
+
+    def _anime(self, sn: int) -> dict:
+        first = sn - sn % self.server.episodes
+        episodes = [{'videoSn': first + i, 'episode': i + 1} for i in range(self.server.episodes)]
+        return {'data': {'anime': {'animeSn': first, 'title': f'基准测试 {first} [2]', 'episodes': {'0': episodes}}}}
+
+    def _master(self, signature: str) -> str:
+        lines = ['#EXTM3U']
+        for width, height, bandwidth in VARIANTS:
+            lines.append(f'#EXT-X-STREAM-INF:BANDWIDTH={bandwidth},RESOLUTION={width}x{height}')
+            lines.append(f'chunklist_b{bandwidth}.m3u8?sig={signature}')
+        return '\n'.join(lines) + '\n'
+
+    def _media(self, bandwidth: str) -> str:
+        lines = ['#EXTM3U', '#EXT-X-VERSION:3', '#EXT-X-TARGETDURATION:4', '#EXT-X-MEDIA-SEQUENCE:0']
+        lines.append(f'#EXT-X-KEY:METHOD=AES-128,URI="key.bin",IV={IV}')
+        for i in range(self.server.segments):
+            lines.append('#EXTINF:4.000,')
+            lines.append(f'b{bandwidth}_{i}.ts')
+        lines.append('#EXT-X-ENDLIST')
+        return '\n'.join(lines) + '\n'
+
+    def _json(self, data: dict):
+        self._send(json.dumps(data, ensure_ascii=False).encode(), 'application/json')
+
+    def _redirect(self, location: str):
+        self.send_response(302)
+        self.send_header('Location', location)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _send(self, body: bytes, content_type: str, status: int = 200):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if not self.server.bandwidth:
+            self.wfile.write(body)
+            return
+        # 按带宽分块发送
+        chunk_size = 64 * 1024
+        for offset in range(0, len(body), chunk_size):
+            chunk = body[offset:offset + chunk_size]
+            self.wfile.write(chunk)
+            time.sleep(len(chunk) / self.server.bandwidth)
+
+def main():
+    parser = argparse.ArgumentParser(description='巴哈姆特 API 与 HLS 源站的本地替身')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=0)
+    parser.add_argument('--latency', type=float, default=0.0, help='每个请求的额外延迟，单位：毫秒')
+    parser.add_argument('--bandwidth', type=float, default=0.0, help='每个连接的带宽，单位：MB/s，0 表示不限')
+    parser.add_argument('--episodes', type=int, default=24)
+    parser.add_argument('--segments', type=int, default=60)
+    parser.add_argument('--segment-size', type=int, default=512 * 1024, help='单个分片的明文大小，单位：字节')
+    args = parser.parse_args()
+    server = FakeBahaServer(
+        (args.host, args.port),
+        latency=args.latency / 1000,
+        bandwidth=args.bandwidth * 1024 * 1024,
+        episodes=args.episodes,
+        segments=args.segments,
+        segment_size=args.segment_size
+    )
+    # 输出实际监听地址，供基准测试进程读取
+    print(server.base_url, flush=True)
+    server.serve_forever()
+
+if __name__ == '__main__':
+    main()